@@ -9,15 +9,43 @@ MODELS_DIR = "$BENCH_HOME/models"
 PROPERTY_TYPES = OrderedDict()
 PROPERTY_TYPES["unr"] = "Unbounded reachability probability"
 PROPERTY_TYPES["rbr"] = "Reward-bounded reachability probability"
-INSTANCES = benchmarkset.create_all_instances()
-NAMES = list(dict.fromkeys([i["name"] for i in INSTANCES]).keys())
-BENCHMARK_SETS = OrderedDict()
-BENCHMARK_SETS["main"] = ["Main benchmark set"]
-BENCHMARK_SETS["unb"] = ["Unbounded reachability"]
-BENCHMARK_SETS["lvls"] = ["Level observation experiments"]
-BENCHMARK_SETS["bnds"] = ["Bound magnitude experiments"]
-for bset in BENCHMARK_SETS:
-    BENCHMARK_SETS[bset].append("{} instances".format(len([i for i in INSTANCES if i["benchmark-set"] == bset])))
+
+BENCHMARK_SET_DESCRIPTIONS = OrderedDict()
+BENCHMARK_SET_DESCRIPTIONS["main"] = "Main benchmark set"
+BENCHMARK_SET_DESCRIPTIONS["unb"] = "Unbounded reachability"
+BENCHMARK_SET_DESCRIPTIONS["lvls"] = "Level observation experiments"
+BENCHMARK_SET_DESCRIPTIONS["bnds"] = "Bound magnitude experiments"
+
+# The instances are only created when they are first accessed (see __getattr__ below), e.g. not for executing invocations.
+# Registries for looking up instances by id, benchmark set, and model name, as well as their position in INSTANCES (e.g. for sorting rows of tables)
+LAZY_ATTRIBUTES = ["INSTANCES", "INSTANCES_BY_ID", "INSTANCES_BY_SET", "INSTANCES_BY_NAME", "INSTANCE_POSITIONS", "NAMES", "BENCHMARK_SETS"]
+REGISTRY = dict() # name of lazy attribute -> value
+
+def index_instance(inst):
+    registry = get_registry()
+    assert inst["id"] not in registry["INSTANCES_BY_ID"], f"Instance with id {inst['id']} is already registered."
+    registry["INSTANCES_BY_ID"][inst["id"]] = inst
+    registry["INSTANCES_BY_SET"].setdefault(inst["benchmark-set"], []).append(inst)
+    registry["INSTANCES_BY_NAME"].setdefault(inst["name"], []).append(inst)
+    registry["INSTANCE_POSITIONS"][inst["id"]] = len(registry["INSTANCE_POSITIONS"])
+
+def register_instance(inst):
+    """ Adds the given (e.g. synthetic) instance to INSTANCES and the registries. """
+    index_instance(inst)
+    get_registry()["INSTANCES"].append(inst)
+
+def get_registry():
+    """ Creates the instances and their registries on first use. """
+    if len(REGISTRY) == 0:
+        REGISTRY.update(INSTANCES=benchmarkset.create_all_instances(), INSTANCES_BY_ID=OrderedDict(), INSTANCES_BY_SET=OrderedDict(), INSTANCES_BY_NAME=OrderedDict(), INSTANCE_POSITIONS=dict())
+        for inst in REGISTRY["INSTANCES"]: index_instance(inst)
+        REGISTRY["NAMES"] = list(REGISTRY["INSTANCES_BY_NAME"].keys())
+        REGISTRY["BENCHMARK_SETS"] = OrderedDict([[bset, [description, "{} instances".format(len(REGISTRY["INSTANCES_BY_SET"].get(bset, [])))]] for bset, description in BENCHMARK_SET_DESCRIPTIONS.items()])
+    return REGISTRY
+
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES: return get_registry()[name]
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 def get_full_model_filename(inst):
     return os.path.join(MODELS_DIR, inst["name"], inst["model"]["file"])
@@ -27,12 +55,12 @@ def get_full_property_filename(inst):
     return os.path.join(MODELS_DIR, inst["name"], inst["property"]["file"])
 
 def from_id(identifier):
-    for b in INSTANCES:
-        if b["id"] == identifier: return b
-    assert False, f"Instance with id {identifier} not found."
+    instances_by_id = get_registry()["INSTANCES_BY_ID"]
+    assert identifier in instances_by_id, f"Instance with id {identifier} not found."
+    return instances_by_id[identifier]
 
 def check_instances():
-    for inst in INSTANCES:
+    for inst in get_registry()["INSTANCES"]:
         modelfilename = replace_placeholders_in_cmd_string(get_full_model_filename(inst))
         assert os.path.isfile(modelfilename), f"Model file {modelfilename} does not exist."
         propfilename = replace_placeholders_in_cmd_string(get_full_property_filename(inst))
@@ -46,8 +74,9 @@ def check_instances():
 
 if __name__ == "__main__":
     check_instances()
-    print(f"Registered {len(NAMES)} benchmark models with {len(INSTANCES)} instances.")
-    for name in NAMES:
-        name_instances = [b for b in INSTANCES if b['name'] == name]
+    registry = get_registry()
+    print(f"Registered {len(registry['NAMES'])} benchmark models with {len(registry['INSTANCES'])} instances.")
+    for name in registry["NAMES"]:
+        name_instances = registry["INSTANCES_BY_NAME"][name]
         print(f"Model '{name}' ({len(name_instances)} instances):\n\t" + "\n\t".join([b['id'] for b in name_instances]))
-    print(f"Registered {len(BENCHMARK_SETS)} benchmark sets: {', '.join(BENCHMARK_SETS)}")
+    print(f"Registered {len(registry['BENCHMARK_SETS'])} benchmark sets: {', '.join(registry['BENCHMARK_SETS'])}")
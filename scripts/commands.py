@@ -1,4 +1,5 @@
-import os, copy, itertools, json, copy
+import os, copy, itertools, json, re, shutil
+import concurrent.futures
 from collections import OrderedDict
 from datetime import date
 
@@ -6,22 +7,72 @@ import benchmarks
 import tools
 from input import *
 from executing import *
+from invocations import write_invocations
+from resultcache import get_file_hash
 
-def check_execution(command):
-    command_repl = replace_placeholders_in_cmd_string(command)
-    print(f"\tTesting execution of {command_repl} ... ", end="")
+PROBE_TIME_LIMIT = 10 # in seconds
+PROBE_CACHE_FILE = os.path.expanduser("~/.cache/rew-bounded-benchmarking/probes.json")
+PROBE_JOBS = 64 # probes are short, so we run (almost) all of them at once
+
+def get_probe_key(command_repl):
+    """ Returns the key of a successful probe of the given command, consisting of the binary (path, modification time and hash) and the arguments. Returns None if the binary does not exist. """
+    tokens = command_repl.split()
+    binary = tokens[0] if os.path.isfile(tokens[0]) else shutil.which(tokens[0])
+    if binary is None: return None
+    return f"{os.path.realpath(binary)}:{os.stat(binary).st_mtime_ns}:{get_file_hash(binary)} {' '.join(tokens[1:])}"
+
+def load_probe_cache():
+    if not os.path.isfile(PROBE_CACHE_FILE): return set()
+    with open(PROBE_CACHE_FILE, 'r', encoding='utf-8-sig') as json_file:
+        return set(json.load(json_file))
+
+def save_probe_cache(probe_keys):
+    os.makedirs(os.path.dirname(PROBE_CACHE_FILE), exist_ok=True)
+    with open(f"{PROBE_CACHE_FILE}.tmp{os.getpid()}", 'w') as json_file:
+        json.dump(sorted(probe_keys), json_file, ensure_ascii=False, indent='\t')
+    os.replace(f"{PROBE_CACHE_FILE}.tmp{os.getpid()}", PROBE_CACHE_FILE)
+
+def probe(command_repl):
+    """ Executes the given command with a short time limit. Returns None on success and a description of the problem otherwise. """
     try:
-        test_out, test_time, test_code = execute_command_line(command_repl, 10)
-        if test_code == 0:
-            print("success!")
-            return True
-        else:
-            print(f"WARN: Non-zero return code '{test_code}'. Output:\n{'-'*80}\n{test_out}{'-'*80}")
-    except KeyboardInterrupt:
-        print("Aborted.")
+        test_out, test_time, test_code = execute_command_line(command_repl, PROBE_TIME_LIMIT)
+        if test_code == 0: return None
+        return f"WARN: Non-zero return code '{test_code}'. Output:\n{'-'*80}\n{test_out}{'-'*80}"
     except Exception as e:
-        print(f"WARN: unable to execute:\n\t\t{e}")
-    return ask_user_yn("Continue?")
+        return f"WARN: unable to execute:\n\t\t{e}"
+
+def check_executions(commands, interactive = True):
+    """
+    Tests whether the given commands can be executed successfully. Successful probes are cached (see get_probe_key), the remaining ones are executed concurrently.
+    For each failed probe, the user is asked whether to continue. Without interaction, failed probes are reported and False is returned.
+    """
+    commands_repl = list(OrderedDict.fromkeys([replace_placeholders_in_cmd_string(c) for c in commands]))
+    probe_cache = load_probe_cache()
+    probe_keys = OrderedDict([[c, get_probe_key(c)] for c in commands_repl])
+    to_probe = [c for c in commands_repl if probe_keys[c] is None or probe_keys[c] not in probe_cache]
+    if len(to_probe) < len(commands_repl):
+        print(f"\tSkipping {len(commands_repl) - len(to_probe)} previously successful test executions.")
+    if len(to_probe) > 1: print(f"\tTesting execution of {len(to_probe)} commands ... ")
+    problems = OrderedDict()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=PROBE_JOBS) as executor:
+            for command_repl, problem in zip(to_probe, executor.map(probe, to_probe)):
+                print(f"\tTesting execution of {command_repl} ... " + ("success!" if problem is None else problem))
+                if problem is None:
+                    if probe_keys[command_repl] is not None: probe_cache.add(probe_keys[command_repl])
+                else:
+                    problems[command_repl] = problem
+    except KeyboardInterrupt: # running probes end after their time limit
+        print("Aborted.")
+        return ask_user_yn("Continue?") if interactive else False
+    finally:
+        save_probe_cache(probe_cache)
+    if len(problems) == 0: return True
+    if not interactive: return False
+    return ask_user_yn(f"{len(problems)} test execution(s) failed. Continue?")
+
+def check_execution(command):
+    return check_executions([command])
 
 def is_supported(inst, cfg):
     if inst["model"]["formalism"] not in cfg["supported-model-formalisms"]: return False
@@ -33,9 +84,170 @@ def get_invocation_id(inst, cfg):
     return f"{cfg['tool']}.{cfg['id']}.{inst['id']}"
 
     
-def get_command_lines(tool_binaries, cfg, inst = None):
-    return [f"{tool_binaries[cfg['tool']]} {tools.get_command_line_args(cfg, inst)}"]
+def get_command_lines(tool_binaries, cfg, inst = None, model_cache_dir = None):
+    return [f"{tool_binaries[cfg['tool']]} {tools.get_command_line_args(cfg, inst, model_cache_dir)}"]
+
+def get_model_cache_entry(tool_binaries, cfg, inst, model_cache_dir):
+    """ Returns the information needed to build the cached model of the given invocation (see modelcache.py), or None if the model is not loaded from the cache. """
+    cached_model_filename = tools.get_cached_model_filename(cfg, inst, model_cache_dir)
+    if cached_model_filename is None: return None
+    root, ext = os.path.splitext(cached_model_filename)
+    entry = OrderedDict()
+    entry["model"] = cached_model_filename
+    entry["build-output"] = f"{root}.building{ext}" # the extension determines the export format
+    entry["build-command"] = f"{tool_binaries[cfg['tool']]} {tools.get_model_build_command_line_args(cfg, inst, entry['build-output'])}"
+    entry["uncached-commands"] = get_command_lines(tool_binaries, cfg, inst) # fallback if the model can not be built
+    return entry
     
+BATCH_TIME_LIMIT_FACTOR = 2 # a batch gets at most this multiple of the time limit of its invocations
+ALIAS_KEYS = ["id", "benchmark-id", "configuration-id", "invocation-note", "log"] # fields that may differ between invocations with identical command lines
+
+def find_aliases(invocations_json):
+    """
+    Finds invocations whose resolved command lines (and limits) are identical, e.g. instances of different benchmark sets that yield the same model and property.
+    Returns a dict that maps the id of the first of these invocations to the alias entries of the others. Only the command lines of the other invocations are kept in memory.
+    """
+    first_ids = dict() # resolved command lines -> id of the first invocation with these command lines
+    aliases = OrderedDict()
+    for inv_json in invocations_json:
+        key = (tuple(" ".join([replace_placeholders_in_cmd_string(c) for c in cmd.split()]) for cmd in inv_json["commands"]), inv_json["time-limit"], inv_json["log-dir"])
+        if key not in first_ids:
+            first_ids[key] = inv_json["id"]
+        else:
+            aliases.setdefault(first_ids[key], []).append(OrderedDict([[k, inv_json[k]] for k in ALIAS_KEYS]))
+    return aliases
+
+def deduplicate_invocations(invocations_json, aliases):
+    """
+    Lazily merges the given invocations according to the given aliases (see find_aliases), which were found on the same invocations.
+    Only the first of the merged invocations is kept. The others are listed in its 'aliases' field and receive a copy of its result after the execution.
+    """
+    alias_ids = set([alias["id"] for entries in aliases.values() for alias in entries])
+    for inv_json in invocations_json:
+        if inv_json["id"] in alias_ids: continue
+        if inv_json["id"] in aliases: inv_json["aliases"] = aliases[inv_json["id"]]
+        yield inv_json
+
+def batch_invocations(invocations_json, tool_binaries):
+    """
+    Groups invocations that only differ in their property (e.g. different reward bounds on the same model) into batches that are executed by a single tool call.
+    The invocations of a batch are listed in its 'batch' field (together with their own command lines). After the execution, the log of the batch is split into logs and results for each of them.
+    The time limit of a batch is the sum of the time limits of its invocations, but at most BATCH_TIME_LIMIT_FACTOR times the time limit of a single invocation.
+    Thus, a hopeless invocation can not use up the time of all invocations behind it. Invocations that the batch did not analyze (in time) are executed on their own (see store_batch_members in run.py).
+    """
+    groups = OrderedDict() # batch key -> invocations
+    for inv_json in invocations_json:
+        cfg = tools.config_from_id(inv_json["tool"], inv_json["configuration-id"])
+        key = (inv_json["tool"], inv_json["time-limit"], inv_json["log-dir"], tools.get_batch_key(cfg, benchmarks.from_id(inv_json["benchmark-id"])))
+        groups.setdefault(key, []).append(inv_json)
+    result = []
+    for members in groups.values():
+        if len(members) == 1:
+            result.append(members[0])
+            continue
+        first = members[0]
+        cfg = tools.config_from_id(first["tool"], first["configuration-id"])
+        insts = [benchmarks.from_id(m["benchmark-id"]) for m in members]
+        batch_json = OrderedDict()
+        batch_json["id"] = f"{first['tool']}.{first['configuration-id']}.batch-{first['benchmark-id']}"
+        batch_json["benchmark-id"] = f"batch-{first['benchmark-id']}"
+        batch_json["tool"] = first["tool"]
+        batch_json["configuration-id"] = first["configuration-id"]
+        batch_json["invocation-note"] = f"{first['invocation-note']}. Batch of {len(members)} invocations"
+        property_filename = os.path.abspath(os.path.join(first["log-dir"], "batch-properties", f"{batch_json['id']}.props"))
+        os.makedirs(os.path.dirname(property_filename), exist_ok=True)
+        tools.create_batch_property_file(cfg, insts, property_filename)
+        batch_json["commands"] = [f"{tool_binaries[first['tool']]} {tools.get_batch_command_line_args(cfg, insts, property_filename)}"]
+        batch_json["time-limit"] = min(sum([m["time-limit"] for m in members]), BATCH_TIME_LIMIT_FACTOR * first["time-limit"]) # all members have the same time limit
+        batch_json["log-dir"] = first["log-dir"]
+        batch_json["log"] = f"{batch_json['id']}.log"
+        batch_json["batch"] = [OrderedDict([[k, m[k]] for k in ALIAS_KEYS + ["commands", "model-cache", "time-limit", "aliases"] if k in m]) for m in members]
+        result.append(batch_json)
+    return result
+
+def generate_invocations(tool_binaries, cfgs, bset_selection, time_limit, log_dir, model_cache_dir = ""):
+    """ Lazily generates the invocations of the given configurations on the supported instances of the selected benchmark sets. """
+    for inst, cfg in itertools.product(benchmarks.INSTANCES, cfgs):
+        if not is_supported(inst, cfg) or inst["benchmark-set"] not in bset_selection: continue
+        inv_json = OrderedDict()
+        inv_json["id"] = get_invocation_id(inst, cfg)
+        inv_json["benchmark-id"] = inst["id"]
+        inv_json["tool"] = cfg["tool"]
+        inv_json["configuration-id"] = cfg["id"]
+        inv_json["invocation-note"] = ". ".join(cfg["notes"])
+        model_cache = get_model_cache_entry(tool_binaries, cfg, inst, model_cache_dir) if model_cache_dir != "" else None
+        inv_json["commands"] = get_command_lines(tool_binaries, cfg, inst, model_cache_dir if model_cache is not None else None)
+        if model_cache is not None: inv_json["model-cache"] = model_cache
+        inv_json["time-limit"] = time_limit
+        inv_json["log-dir"] = log_dir
+        inv_json["log"] = f"{inv_json['id']}.log"
+        yield inv_json
+
+def write_campaign(inv_name, tool_binaries, cfgs, bset_selection, time_limit, log_dir, model_cache_dir = "", deduplicate = True, batch = False, append = False):
+    """
+    Creates the invocations file of a campaign (or appends to it, see write_invocations in invocations.py).
+    Without batching, invocations are written as they are generated. Deduplication generates them twice instead: first to find the aliases, then to write them.
+    Batching needs all invocations to be known first.
+    """
+    if not os.path.exists(log_dir): os.makedirs(log_dir)
+    if model_cache_dir != "" and not os.path.exists(model_cache_dir): os.makedirs(model_cache_dir)
+    print(f"Storing information for invocations in {inv_name} ... ", end="", flush=True)
+    invocations_json = generate_invocations(tool_binaries, cfgs, bset_selection, time_limit, log_dir, model_cache_dir)
+    if batch:
+        invocations_json = list(invocations_json)
+    if deduplicate:
+        aliases = find_aliases(invocations_json if batch else generate_invocations(tool_binaries, cfgs, bset_selection, time_limit, log_dir, model_cache_dir))
+        invocations_json = deduplicate_invocations(invocations_json, aliases)
+        num_merged = sum([len(entries) for entries in aliases.values()])
+        if num_merged > 0:
+            print(f"merged {num_merged} invocations with identical command lines ... ", end="")
+    if batch:
+        invocations_json = list(invocations_json)
+        num_invocations = len(invocations_json)
+        invocations_json = batch_invocations(invocations_json, tool_binaries)
+        print(f"batched {num_invocations} invocations into {len(invocations_json)} tool calls ... ", end="")
+    num_written = write_invocations(invocations_json, inv_name, append)
+    print(f"done ({num_written} invocations).")
+
+CAMPAIGN_KEYS = ["tools", "configurations", "benchmark-sets", "time-limit", "log-dir", "invocations-file", "model-cache", "deduplicate", "batch", "append", "check-execution"]
+
+def create_invocations_from_campaign(campaign_path):
+    """
+    Non-interactively creates the invocations file described by the given campaign file, a json object with the fields
+        tools            maps the name of each tool to the path of its binary
+        configurations   patterns (regular expressions) of the configuration ids to run (default: all configurations)
+        benchmark-sets   names of the benchmark sets to run (default: all benchmark sets)
+        time-limit       in seconds
+        log-dir          the logfile directory
+        invocations-file the file for storing the invocation information (line-delimited if it ends with '.jsonl')
+        model-cache      directory for caching built models (optional)
+        deduplicate      merge invocations with identical command lines (default: true)
+        batch            batch invocations that only differ in their property (default: false)
+        append           append the invocations to an existing jsonl file instead of overwriting it (default: false)
+        check-execution  test whether the tool can be executed with each configuration before creating the invocations (default: true)
+    """
+    with open(campaign_path, 'r', encoding='utf-8-sig') as json_file:
+        campaign = json.load(json_file, object_pairs_hook=OrderedDict)
+    for key in campaign:
+        assert key in CAMPAIGN_KEYS, f"Unknown field '{key}' in campaign file {campaign_path}. Expected any of {CAMPAIGN_KEYS}."
+    for key in ["tools", "time-limit", "log-dir", "invocations-file"]:
+        assert key in campaign, f"Missing field '{key}' in campaign file {campaign_path}."
+    tool_binaries = campaign["tools"]
+    for t in tool_binaries:
+        assert t in tools.TOOL_NAMES, f"Unknown tool '{t}' in campaign file {campaign_path}."
+    cfg_patterns = campaign.get("configurations", [".*"])
+    cfgs = [c for t in tool_binaries for c in tools.TOOL_NAMES[t].CONFIGS if any([re.fullmatch(p, c["id"]) for p in cfg_patterns])]
+    for p in cfg_patterns:
+        if not any([re.fullmatch(p, c["id"]) for c in cfgs]): print(f"WARN: No configuration matches '{p}'.")
+    bset_selection = campaign.get("benchmark-sets", list(benchmarks.BENCHMARK_SETS.keys()))
+    for bset in bset_selection:
+        assert bset in benchmarks.BENCHMARK_SETS, f"Unknown benchmark set '{bset}' in campaign file {campaign_path}."
+    print(f"Selected {len(cfgs)} tool configurations and benchmark sets {', '.join(bset_selection)}.")
+    if campaign.get("check-execution", True) and not check_executions([cmd for cfg in cfgs for cmd in get_command_lines(tool_binaries, cfg)], interactive=False):
+        print("ERROR: Test executions failed.")
+        exit(-1)
+    write_campaign(campaign["invocations-file"], tool_binaries, cfgs, bset_selection, int(campaign["time-limit"]), campaign["log-dir"], campaign.get("model-cache", ""), campaign.get("deduplicate", True), campaign.get("batch", False), campaign.get("append", False))
+
 def create_invocations():
     tool_options = OrderedDict([[t.NAME, t.DESCRIPTION] for t in tools.TOOLS])
     tool_selection = input_selection("Tools", tool_options)
@@ -50,36 +262,15 @@ def create_invocations():
     cfg_selection = input_selection("Tool Configurations", cfg_options)
     cfgs = [c for c in tool_configs if c["id"] in cfg_selection]
     print(f"Selected {len(cfgs)} Tool configurations.")
-    for cfg in cfgs:
-        for cmd in get_command_lines(tool_binaries, cfg):
-            if not check_execution(cmd): exit(-1)
+    if not check_executions([cmd for cfg in cfgs for cmd in get_command_lines(tool_binaries, cfg)]): exit(-1)
 
     bset_selection = input_selection("Benchmark Sets", benchmarks.BENCHMARK_SETS)
-    invocations = [OrderedDict(id=get_invocation_id(inst,cfg), instance=inst, configuration=cfg) for inst,cfg in itertools.product(benchmarks.INSTANCES, cfgs) if is_supported(inst, cfg) and inst["benchmark-set"] in bset_selection]
-    print(f"Selected {len(invocations)} invocations.")
+    num_invocations = len([None for inst, cfg in itertools.product(benchmarks.INSTANCES, cfgs) if is_supported(inst, cfg) and inst["benchmark-set"] in bset_selection])
+    print(f"Selected {num_invocations} invocations.")
 
     time_limit = int(ask_user_for_info(f"Enter a time limit (in seconds):", "1800", lambda usr_in : usr_in.isdigit()))
     log_dir = ask_user_for_info(f"Enter a logfile directory ", f"logs{date.today()}")
-    if not os.path.exists(log_dir): os.makedirs(log_dir)
-    inv_name = ask_user_for_info(f"Enter a file for storing the invocation information ", f"inv{date.today()}.json", ask_user_overwrite_file)
-    print(f"Storing information for {len(invocations)} invocations ... ", end="")
-    invocations_json = []
-    for inv in invocations:
-        inv_json = OrderedDict()
-        inv_json["id"] = inv["id"]
-        inv_json["benchmark-id"] = inv["instance"]["id"]
-        inv_json["tool"] = inv["configuration"]["tool"]
-        inv_json["configuration-id"] = inv["configuration"]["id"]
-        inv_json["invocation-note"] = ". ".join(inv["configuration"]["notes"])        
-        inv_json["commands"] = get_command_lines(tool_binaries, inv["configuration"], inv["instance"])
-        inv_json["time-limit"] = time_limit
-        inv_json["log-dir"] = log_dir
-        inv_json["log"] = f"{inv['id']}.log"
-        invocations_json.append(inv_json)
-    with open(inv_name, 'w') as json_file:
-        json.dump(invocations_json, json_file, ensure_ascii=False, indent='\t')
-    print("done.")
-    
-
-    
-    
+    inv_name = ask_user_for_info(f"Enter a file for storing the invocation information ", f"inv{date.today()}.jsonl", ask_user_overwrite_file)
+    model_cache_dir = ask_user_for_info(f"Enter a directory for caching built models (leave empty to build the model in each invocation) ", "")
+    batch = ask_user_yn("Batch invocations that only differ in their property (e.g. the reward bounds) into a single tool call?")
+    write_campaign(inv_name, tool_binaries, cfgs, bset_selection, time_limit, log_dir, model_cache_dir, True, batch)
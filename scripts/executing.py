@@ -1,4 +1,5 @@
-import os, sys, subprocess, threading, time, signal, copy
+import os, sys, subprocess, threading, time, signal, copy, shutil, tempfile, resource, selectors, traceback, math
+from collections import OrderedDict
 
 if sys.version_info[0] < 3:
     sys.exit("You need to run this with Python 3. Try:\npython3 {}".format(" ".join(sys.argv)))
@@ -7,69 +8,332 @@ def replace_placeholders_in_cmd_string(cmd_string):
     bench_home = os.path.realpath(os.path.join(sys.path[0], ".."))
     return os.path.expanduser(cmd_string).replace("$BENCH_HOME", bench_home)
 
+# Commands that are currently executed (possibly by several worker threads).
+RUNNING_COMMANDS = set()
+RUNNING_COMMANDS_LOCK = threading.Lock()
+# Set once all running commands shall be aborted. No further commands are started afterwards.
+ABORT_REQUESTED = threading.Event()
+
+def abort_all_commands(grace_period = 5):
+    """
+    Terminates the process groups of all running commands (e.g. after the user pressed CTRL+C) and prevents new commands from being started.
+    Process groups that are still alive after the grace period (in seconds) are killed.
+    """
+    ABORT_REQUESTED.set()
+    with RUNNING_COMMANDS_LOCK:
+        running = list(RUNNING_COMMANDS)
+    for execution in running:
+        execution.abort()
+    deadline = time.time() + grace_period
+    for execution in running:
+        execution.finished.wait(max(0, deadline - time.time()))
+    for execution in running:
+        if not execution.finished.is_set(): execution.send_signal(signal.SIGKILL)
+
+
+STDERR_HEADING = "\n" + "#"*30 + "Output to stderr" + "#"*30 + "\n"
+
+def read_excerpt(file, max_bytes):
+    """ Returns the beginning and the end of the given binary file (both at most max_bytes long) as a string. """
+    size = os.fstat(file.fileno()).st_size
+    file.seek(0)
+    if size <= 2 * max_bytes:
+        return file.read().decode('utf8', errors='replace')
+    head = file.read(max_bytes)
+    file.seek(size - max_bytes)
+    tail = file.read()
+    return "{}\n[... {} bytes omitted ...]\n{}".format(head.decode('utf8', errors='replace'), size - 2 * max_bytes, tail.decode('utf8', errors='replace'))
+
+
+ADDRESS_SPACE_LIMIT_ENFORCED = sys.platform != "darwin" # macOS accepts no limit on the address space of a process
+OUT_OF_MEMORY_OUTPUTS = ["std::bad_alloc", "Cannot allocate memory"] # outputs of programs whose allocations failed
+
+def get_process_groups_rss(pgids):
+    """ Returns a dictionary with the resident set size (in MB) summed over all processes of each of the given process groups. Without a /proc filesystem (e.g. on macOS), ps is used. """
+    if not os.path.isdir("/proc"):
+        rss_kb = dict([[pgid, 0] for pgid in pgids])
+        for line in subprocess.run(["ps", "-A", "-o", "pgid=", "-o", "rss="], stdout=subprocess.PIPE, universal_newlines=True).stdout.splitlines():
+            fields = line.split()
+            if len(fields) == 2 and int(fields[0]) in rss_kb: rss_kb[int(fields[0])] += int(fields[1])
+        return dict([[pgid, kb / 1024] for pgid, kb in rss_kb.items()])
+    rss_pages = dict([[pgid, 0] for pgid in pgids])
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit(): continue
+        try:
+            with open(f"/proc/{pid}/stat", 'r') as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue # the process terminated in the meantime
+        fields = stat[stat.rindex(")") + 2:].split() # the process name might contain spaces. fields[0] is the 3rd entry of the stat file
+        if int(fields[2]) in rss_pages: rss_pages[int(fields[2])] += int(fields[21])
+    return dict([[pgid, pages * resource.getpagesize() / (1024 * 1024)] for pgid, pages in rss_pages.items()])
+
+# Keys of the resource usage information in the result json. Values are accumulated over all commands of an invocation.
+RESOURCE_USAGE_KEYS = ["peak-memory", "user-time", "system-time", "major-page-faults", "minor-page-faults", "voluntary-context-switches", "involuntary-context-switches"]
+
+def get_resource_usage(rusage):
+    """ Converts the rusage of a reaped child process. Peak memory is given in MB. """
+    res = OrderedDict()
+    res["peak-memory"] = rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024) # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    res["user-time"] = rusage.ru_utime
+    res["system-time"] = rusage.ru_stime
+    res["major-page-faults"] = rusage.ru_majflt
+    res["minor-page-faults"] = rusage.ru_minflt
+    res["voluntary-context-switches"] = rusage.ru_nvcsw
+    res["involuntary-context-switches"] = rusage.ru_nivcsw
+    return res
+
+def accumulate_resource_usage(total, usage):
+    """ Adds the resource usage of another command to the given total (peak memory is the maximum, all other values are summed up). """
+    for key in RESOURCE_USAGE_KEYS:
+        if key not in total: total[key] = usage[key]
+        elif key == "peak-memory": total[key] = max(total[key], usage[key])
+        else: total[key] += usage[key]
+
+
+class ProcessSupervisor(object):
+    """
+    Supervises the process groups of all running commands from a single thread.
+    It reaps terminated processes (collecting their resource usage) and enforces time limits (SIGTERM, followed by SIGKILL after a grace period).
+    It also kills process groups whose resident memory exceeds their memory limit. This only catches what the hard limit on the address space of each process
+    (see CommandExecution.run) misses, i.e., several processes that exceed the limit together and processes on macOS.
+    Terminated processes are detected through pidfds where available and by polling otherwise.
+    As the output of the processes is redirected to files, there is nothing to drain.
+    """
+    KILL_GRACE_PERIOD = 60 # in seconds, time the program gets to terminate by itself before SIGKILL is sent
+    POLL_INTERVAL = 0.1 # in seconds, only used if pidfds are not available
+    MEMORY_POLL_INTERVAL = 0.5 # in seconds
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.supervised = dict() # pid -> [command execution, termination deadline, kill deadline, memory limit, pidfd]
+        self.new_pids = [] # pids of newly supervised processes, registered by the supervisor thread
+        self.thread = None
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ)
+        self.use_pidfds = hasattr(os, "pidfd_open")
+        self.next_memory_check = 0
+
+    def supervise(self, command, timelimit, memory_limit = None):
+        """ Starts supervising the (already started) process of the given command execution. command.finished is set once the process is reaped. """
+        now = time.time()
+        with self.lock:
+            self.supervised[command.proc.pid] = [command, now + timelimit, now + timelimit + self.KILL_GRACE_PERIOD, memory_limit, None]
+            self.new_pids.append(command.proc.pid)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.loop, name="ProcessSupervisor", daemon=True)
+                self.thread.start()
+        os.write(self.wakeup_write, b"\0")
+
+    def reap(self, pid, blocking):
+        """ Reaps the given process if it terminated (or waits for it if blocking is set). Returns True if the process was reaped. """
+        reaped_pid, status, rusage = os.wait4(pid, 0 if blocking else os.WNOHANG)
+        if reaped_pid == 0: return False
+        with self.lock:
+            command, _, _, _, pidfd = self.supervised.pop(pid)
+        if pidfd is not None:
+            self.selector.unregister(pidfd)
+            os.close(pidfd)
+        command.end_time = time.time()
+        command.proc.returncode = os.waitstatus_to_exitcode(status)
+        command.resource_usage = get_resource_usage(rusage)
+        command.finished.set()
+        return True
+
+    def register_new_pids(self):
+        with self.lock:
+            new_pids, self.new_pids = self.new_pids, []
+        for pid in new_pids:
+            if not self.use_pidfds: continue
+            try:
+                pidfd = os.pidfd_open(pid)
+            except OSError:
+                self.use_pidfds = False # e.g. an old kernel. Fall back to polling
+                continue
+            self.supervised[pid][4] = pidfd
+            self.selector.register(pidfd, selectors.EVENT_READ, pid)
+
+    def enforce_limits(self, now):
+        with self.lock:
+            items = list(self.supervised.items())
+        for _, entry in items:
+            command, term_deadline, kill_deadline = entry[0], entry[1], entry[2]
+            if now >= kill_deadline:
+                command.send_sigkill()
+                entry[2] = float("inf")
+            elif now >= term_deadline:
+                command.stop()
+                entry[1] = float("inf")
+        memory_limits = dict([[pid, entry[3]] for pid, entry in items if entry[3] is not None])
+        if len(memory_limits) > 0 and now >= self.next_memory_check:
+            self.next_memory_check = now + self.MEMORY_POLL_INTERVAL
+            for pgid, rss in get_process_groups_rss(memory_limits.keys()).items():
+                if rss > memory_limits[pgid]:
+                    with self.lock:
+                        if pgid not in self.supervised: continue
+                        command = self.supervised[pgid][0]
+                        self.supervised[pgid][3] = None
+                    command.exceed_memory_limit()
+
+    def get_select_timeout(self, now):
+        with self.lock:
+            entries = list(self.supervised.values())
+        if len(entries) == 0: return None
+        wakeup_time = min([min(e[1], e[2]) for e in entries])
+        if any(e[3] is not None for e in entries): wakeup_time = min(wakeup_time, self.next_memory_check)
+        timeout = max(0, wakeup_time - now)
+        if not self.use_pidfds: return min(timeout, self.POLL_INTERVAL)
+        return None if timeout == float("inf") else timeout
+
+    def loop(self):
+        while True:
+            try:
+                self.loop_iteration()
+            except Exception:
+                traceback.print_exc() # keep supervising the remaining processes
+
+    def loop_iteration(self):
+        self.register_new_pids()
+        for key, _ in self.selector.select(self.get_select_timeout(time.time())):
+            if key.fd == self.wakeup_read:
+                os.read(self.wakeup_read, 4096)
+            else:
+                self.reap(key.data, blocking=True)
+        if not self.use_pidfds:
+            with self.lock:
+                pids = [pid for pid, entry in self.supervised.items() if entry[4] is None]
+            for pid in pids:
+                self.reap(pid, blocking=False)
+        self.enforce_limits(time.time())
+
+SUPERVISOR = ProcessSupervisor()
+
 
 class CommandExecution(object):
-    """ Represents the execution of a single command line argument. """
+    """
+    Represents the execution of a single command line argument.
+    The output of the command is written to disk (either to spill files or anonymous temporary files) instead of being kept in memory.
+    """
+    EXCERPT_BYTES = 16 * 1024 # size of the beginning and end of the output that is kept in memory
+
     def __init__(self):
         self.timelimit = None
         self.return_code = None
         self.output = None
         self.wall_time = None
         self.proc = None
+        self.aborted = False
+        self.messages = "" # messages of the benchmarking tool that precede the output of the command
+        self.stdout_file = None
+        self.stderr_file = None
+        self.resource_usage = None
+        self.finished = threading.Event() # set by the supervisor once the process is reaped
+        self.end_time = None
+        self.memlimit = None
+
+    def send_signal(self, sig):
+        try:
+            os.killpg(self.proc.pid, sig) # Send the signal to all the process groups. The process group id equals the pid of the process due to start_new_session
+        except ProcessLookupError:
+            pass
 
     def stop(self):
         self.timelimit = True
         sys.stdout.write("sending termination request... ")
         sys.stdout.flush()
-        try:
-            os.killpg(os.getpgid(self.proc.pid), signal.SIGTERM) # Send the signal to all the process groups
-        except ProcessLookupError:
-            pass
+        self.send_signal(signal.SIGTERM)
 
     def send_sigkill(self):
         sys.stdout.write("killing process... ")
         sys.stdout.flush()
-        try:
-            os.killpg(os.getpgid(self.proc.pid), signal.SIGKILL) # Send the signal to all the process groups
-        except ProcessLookupError:
-            pass
-            
+        self.send_signal(signal.SIGKILL)
+
+    def exceed_memory_limit(self):
+        self.memlimit = True
+        sys.stdout.write("memory limit exceeded, killing process... ")
+        sys.stdout.flush()
+        self.send_signal(signal.SIGKILL) # there is no point in giving the process time to terminate since it keeps occupying memory
+
+    def abort(self):
+        self.aborted = True
+        self.send_signal(signal.SIGTERM)
+
+    def open_output_files(self, spill_path):
+        if spill_path is None:
+            self.stdout_file = tempfile.TemporaryFile()
+            self.stderr_file = tempfile.TemporaryFile()
+        else:
+            self.stdout_file = open(spill_path + ".stdout", 'w+b')
+            self.stderr_file = open(spill_path + ".stderr", 'w+b')
+
+    def close(self):
+        """ Closes (and removes) the files holding the output of the command. """
+        for file in [self.stdout_file, self.stderr_file]:
+            if file is None: continue
+            file.close()
+            if isinstance(file.name, str) and os.path.isfile(file.name): os.remove(file.name)
+        self.stdout_file, self.stderr_file = None, None
+
+    def get_output_excerpt(self):
+        """ Returns the messages and (the beginning and end of) the output of the command, including output to stderr, if present. """
+        output = self.messages + read_excerpt(self.stdout_file, self.EXCERPT_BYTES)
+        if os.fstat(self.stderr_file.fileno()).st_size > 0:
+            output += STDERR_HEADING + read_excerpt(self.stderr_file, self.EXCERPT_BYTES)
+        return output
 
-    def run(self, command_line_str, timelimit):
+    def write_output(self, logfile):
+        """ Copies the messages and the full output of the command to the given binary file in chunks. """
+        logfile.write(self.messages.encode('utf8'))
+        self.stdout_file.seek(0)
+        shutil.copyfileobj(self.stdout_file, logfile)
+        if os.fstat(self.stderr_file.fileno()).st_size > 0:
+            logfile.write(STDERR_HEADING.encode('utf8'))
+            self.stderr_file.seek(0)
+            shutil.copyfileobj(self.stderr_file, logfile)
+
+    def run(self, command_line_str, timelimit, spill_path = None, memory_limit = None):
+        """
+        Runs the command with the given time limit (in seconds) and, optionally, memory limit (in MB).
+        The memory limit is a hard limit on the address space of each process, i.e., allocations beyond it fail. A command that fails with an out-of-memory message counts as memout.
+        Moreover, the resident set size of the whole process group is polled, and the group is killed once it exceeds the limit (see ProcessSupervisor).
+        The output is written to spill_path + '.stdout' and spill_path + '.stderr' or to anonymous temporary files if no spill path is given.
+        The files remain available (e.g. for write_output) until close() is called.
+        """
         command_line_list = [ replace_placeholders_in_cmd_string(c) for c in command_line_str.split() ]
-        # We need to make sure that the process and all its childs are killed properly. Therefore, work with processgroups
-        # From https://stackoverflow.com/a/4791612
-        # The os.setsid() is passed in the argument preexec_fn so
-        # it's run after the fork() and before  exec() to run the shell.
-        self.proc = subprocess.Popen(command_line_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE, preexec_fn=os.setsid)
-        start_time = time.time()
-        timer1 = threading.Timer(timelimit, self.stop)
-        timer2 = threading.Timer(timelimit + 60, self.send_sigkill) # give the program 60 seconds to terminate by itself, send SIGKILL afterwards
+        self.open_output_files(spill_path)
+        if memory_limit is not None and ADDRESS_SPACE_LIMIT_ENFORCED:
+            # limit the address space via the shell, as preexec_fn is not safe while other scheduler threads are running
+            command_line_list = ["sh", "-c", 'ulimit -v {} && exec "$@"'.format(int(memory_limit * 1024)), "sh"] + command_line_list
         self.timelimit = False
-        self.output = ""
-        timer1.start()
-        timer2.start()
+        self.memlimit = False
+        # We need to make sure that the process and all its childs are killed properly. Therefore, the process runs in a new session (and thus processgroup)
+        self.proc = subprocess.Popen(command_line_list, stdout=self.stdout_file, stderr=self.stderr_file, start_new_session=True)
+        start_time = time.time()
+        with RUNNING_COMMANDS_LOCK:
+            RUNNING_COMMANDS.add(self)
+            if ABORT_REQUESTED.is_set(): self.abort() # abort_all_commands was called while we were starting the process
+        SUPERVISOR.supervise(self, timelimit, memory_limit)
         try:
-            stdout, stderr = self.proc.communicate()
+            self.finished.wait()
         except KeyboardInterrupt:
-            stdout = None
-            stderr = None
-            self.output += "Execution aborted after {:.2f} seconds.\n".format(time.time() - start_time)
+            self.aborted = True # the result must not be stored as a regular one
             sys.stdout.write("aborting after {:.2f} seconds ...".format(time.time() - start_time))
             sys.stdout.flush()
+            self.send_signal(signal.SIGKILL) # the process group does not receive the interrupt as it runs in its own session
+            self.finished.wait()
             # give the user time for another interrupt
             time.sleep(2)
-        except Exception as e:
-            self.output = self.output + "Error when executing the command:\n{}\n".format(e)
         finally:
-            timer1.cancel()
-            timer2.cancel()
-            self.wall_time = time.time() - start_time
+            with RUNNING_COMMANDS_LOCK:
+                RUNNING_COMMANDS.discard(self)
+            self.wall_time = (self.end_time if self.end_time is not None else time.time()) - start_time
             self.return_code = self.proc.returncode
-        if stdout is not None:
-            self.output = self.output + stdout.decode('utf8')
-        if stderr is not None and len(stderr) > 0:
-            self.output = self.output + "\n" + "#"*30 + "Output to stderr" + "#"*30 + "\n" + stderr.decode('utf8')
+        if self.aborted:
+            self.messages += "Execution aborted after {:.2f} seconds.\n".format(self.wall_time)
+        self.output = self.get_output_excerpt()
+        if memory_limit is not None and not (self.timelimit or self.aborted) and self.return_code != 0 and any(m in self.output for m in OUT_OF_MEMORY_OUTPUTS):
+            self.memlimit = True # an allocation failed due to the limit on the address space
         if self.timelimit and self.wall_time <= timelimit:
             print("WARN: A timelimit was triggered although the measured time is {} seconds which is still below the time limit of {} seconds".format(self.wall_time, timelimit))
 
@@ -77,24 +341,62 @@ class CommandExecution(object):
 def execute_command_line(command_line_str, timelimit):
     """
     Executes the given command line with the given time limit (in seconds).
-    :returns the output of the command (including the output to stderr, if present), the runtime of the command and either the return code or None (in case of a timelimit)
+    :returns the output of the command (including the output to stderr, if present; long outputs are shortened to their beginning and end), the runtime of the command and either the return code or None (in case of a timelimit)
     """
     execution = CommandExecution()
-    execution.run(command_line_str, timelimit)
-    if execution.timelimit:
+    try:
+        execution.run(command_line_str, timelimit)
+    finally:
+        execution.close()
+    if execution.timelimit or execution.aborted:
         return execution.output, execution.wall_time, None
     else:
         return execution.output, execution.wall_time, execution.return_code
 
 
+def get_median_confidence_interval(samples, confidence = 0.95):
+    """
+    Returns a distribution-free confidence interval for the median of the given samples, based on their order statistics.
+    For fewer than six samples, this is the range of the samples (and the actual confidence is lower than requested).
+    """
+    samples = sorted(samples)
+    n = len(samples)
+    k, cdf = 0, 0.0 # find the largest k with P(X < k) <= (1 - confidence) / 2 for X ~ Bin(n, 1/2)
+    while k < n // 2:
+        p = math.comb(n, k) / 2**n
+        if cdf + p > (1 - confidence) / 2: break
+        cdf += p
+        k += 1
+    return [samples[max(0, k - 1)], samples[min(n - 1, n - k)]]
+
+def get_timing_statistics(samples):
+    """ Summarizes the wallclock times of repeated executions. """
+    import statistics # only needed for repetitions, so it does not slow down the startup of run.py
+    res = OrderedDict()
+    res["wallclock-time-samples"] = samples
+    res["wallclock-time-median"] = statistics.median(samples)
+    res["wallclock-time-min"] = min(samples)
+    res["wallclock-time-ci"] = get_median_confidence_interval(samples)
+    return res
+
+
 class Execution(object):
+    """
+    Executes the commands of an invocation and writes their output to its logfile.
+    If the invocation specifies 'warmup-runs' and/or 'repetitions', it is executed several times. Only the last execution is logged.
+    The wallclock time is then the median of the (non-warm-up) repetitions, and the result also contains all samples, their minimum and a confidence interval.
+    Repetitions stop after the first execution that does not succeed (e.g. a timeout). Its result is reported instead.
+    """
     def __init__(self, invocation_json):
         self.invocation = invocation_json
         self.wall_time = None
-        self.logs = None
         self.timeout = None
         self.error = None
         self.return_codes = None
+        self.resource_usage = None
+        self.memout = None
+        self.aborted = False
+        self.timing_statistics = None
 
     def to_json(self):
         res = copy.deepcopy(self.invocation)
@@ -104,31 +406,186 @@ class Execution(object):
             res["timeout"] = self.timeout
         if self.error is not None:
             res["execution-error"] = self.error
+        if self.memout is not None:
+            res["memout"] = self.memout # only present if the memory limit was enforced by the benchmarking tool
         if self.return_codes is not None:
             res["return-codes"] = self.return_codes
+        if self.resource_usage is not None:
+            res.update(self.resource_usage)
+        if self.timing_statistics is not None:
+            res.update(self.timing_statistics)
         return res                   
 
     def run(self):
+        warmup_runs = self.invocation.get("warmup-runs", 0)
+        repetitions = self.invocation.get("repetitions", 1)
+        samples = []
+        for k in range(warmup_runs + repetitions):
+            self.run_once()
+            if self.aborted or self.timeout or self.error or self.memout: break
+            if k >= warmup_runs: samples.append(self.wall_time)
+        if repetitions > 1 and len(samples) == repetitions:
+            self.timing_statistics = get_timing_statistics(samples)
+            self.wall_time = self.timing_statistics["wallclock-time-median"]
+        return self.to_json()
+
+    def run_once(self):
         self.error = False
         self.timeout = False
         self.wall_time = 0.0
-        self.logs = []
         self.return_codes = []
-        for command in self.invocation["commands"]:
-            log, wall_time, return_code = execute_command_line(command, self.invocation["time-limit"] - self.wall_time)
-            self.wall_time = self.wall_time + wall_time
-            self.logs.append("Command:\t{}\nWallclock time:\t{}\nReturn code:\t{}\nOutput:\n{}\n".format(command, wall_time, return_code, log))
-            if return_code is None:
-                self.timeout = True
-                self.error = False
-                self.logs[-1] = self.logs[-1] + "\n" + "-"*10 + "\nComputation aborted after {} seconds since the total time limit of {} seconds was exceeded.\n".format(self.wall_time, self.invocation["time-limit"])
-                self.return_codes.append(-9) # process got killed due to timeout
-                break
-            else:
-                self.error = self.error or return_code != 0
-                self.return_codes.append(return_code)
-        # save logfile
-        with open(os.path.join(self.invocation["log-dir"], self.invocation["log"]), 'w', encoding="utf-8") as logfile:
-            hline = "\n" + "#" * 40 + "\n"
-            logfile.write(hline.join(self.logs))
-        return self.to_json()
+        self.resource_usage = OrderedDict()
+        memory_limit = self.invocation.get("memory-limit")
+        self.memout = False if memory_limit is not None else None
+        log_path = os.path.join(self.invocation["log-dir"], self.invocation["log"])
+        command_logs = [] # (header, command execution, trailer) for each executed command
+        try:
+            for command in self.invocation["commands"]:
+                if ABORT_REQUESTED.is_set():
+                    self.aborted = True
+                    break
+                command_execution = CommandExecution()
+                command_logs.append(["", command_execution, ""])
+                command_execution.run(command, self.invocation["time-limit"] - self.wall_time, f"{log_path}.cmd{len(command_logs)}", memory_limit)
+                wall_time = command_execution.wall_time
+                if command_execution.resource_usage is not None: accumulate_resource_usage(self.resource_usage, command_execution.resource_usage)
+                return_code = None if command_execution.timelimit or command_execution.memlimit or command_execution.aborted else command_execution.return_code
+                self.wall_time = self.wall_time + wall_time
+                command_logs[-1][0] = "Command:\t{}\nWallclock time:\t{}\nReturn code:\t{}\nOutput:\n".format(command, wall_time, return_code)
+                if return_code is None and (command_execution.aborted or ABORT_REQUESTED.is_set()): # e.g. CTRL+C during a sequential run
+                    self.aborted = True
+                    command_logs[-1][2] = "\n" + "-"*10 + "\nComputation aborted after {} seconds since all running executions were aborted.\n".format(self.wall_time)
+                    break
+                elif return_code is None and command_execution.memlimit:
+                    self.memout = True
+                    self.error = False
+                    command_logs[-1][2] = "\n" + "-"*10 + "\nComputation aborted after {} seconds since the memory limit of {} MB was exceeded.\n".format(self.wall_time, memory_limit)
+                    self.return_codes.append(-9) # process got killed due to memout
+                    break
+                elif return_code is None:
+                    self.timeout = True
+                    self.error = False
+                    command_logs[-1][2] = "\n" + "-"*10 + "\nComputation aborted after {} seconds since the total time limit of {} seconds was exceeded.\n".format(self.wall_time, self.invocation["time-limit"])
+                    self.return_codes.append(-9) # process got killed due to timeout
+                    break
+                else:
+                    self.error = self.error or return_code != 0
+                    self.return_codes.append(return_code)
+            # save logfile. The output of the commands is copied from the spill files in chunks
+            with open(log_path, 'wb') as logfile:
+                hline = "\n" + "#" * 40 + "\n"
+                for i, (header, command_execution, trailer) in enumerate(command_logs):
+                    if i > 0: logfile.write(hline.encode('utf8'))
+                    logfile.write(header.encode('utf8'))
+                    command_execution.write_output(logfile)
+                    logfile.write(("\n" + trailer).encode('utf8'))
+        finally:
+            for _, command_execution, _ in command_logs:
+                command_execution.close()
+
+
+def parse_memory_size(size_str):
+    """ Parses a memory size such as '512M', '64G' or '1.5T' and returns it in megabytes. Plain numbers are interpreted as megabytes. """
+    units = {"K": 1/1024, "M": 1, "G": 1024, "T": 1024**2}
+    size_str = size_str.strip().upper().rstrip("B")
+    if len(size_str) > 0 and size_str[-1] in units:
+        return float(size_str[:-1]) * units[size_str[-1]]
+    return float(size_str)
+
+
+class InvocationScheduler(object):
+    """
+    Runs invocations on a bounded pool of worker threads.
+    The actual work happens in child processes, so the threads merely wait for them.
+    If a memory budget (in MB) is given, a job is only admitted if its estimated peak memory fits into what is left of the budget.
+    Jobs can be organized in chains (e.g. configuration families): jobs of the same chain never run concurrently and are started in the given order.
+    """
+    def __init__(self, num_workers, memory_budget = None, estimate_memory = None, get_chain = None, skip_job = None):
+        """
+        :param get_chain: optional function that returns the chain of a job (or None if the job is not part of a chain)
+        :param skip_job: optional function that is called right before a job would be started (and only then, e.g. to claim it). If it returns True, the job is not executed
+        """
+        assert num_workers >= 1, f"Invalid number of workers: {num_workers}"
+        self.num_workers = num_workers
+        self.memory_budget = memory_budget
+        self.estimate_memory = estimate_memory
+        self.get_chain = get_chain
+        self.skip_job = skip_job
+        self.max_overtakes = 2 * num_workers # how often jobs may overtake the first startable job before it gets exclusive admission
+
+    def get_memory_reservation(self, job):
+        """ Returns the amount of memory (in MB) that is reserved while the given job runs. Unknown estimates get a fair share of the budget. """
+        estimate = None if self.estimate_memory is None else self.estimate_memory(job)
+        if estimate is None: estimate = self.memory_budget / self.num_workers
+        return min(estimate, self.memory_budget) # a job that exceeds the budget can still run on its own
+
+    def run(self, jobs, run_job, on_done = None):
+        """
+        Executes run_job(job) for all given jobs, using at most num_workers concurrent workers.
+        Jobs are started in the given order, except that a job may overtake pending jobs whose chain is busy or that do not fit into the remaining memory budget.
+        on_done(job, result, exception) is called from the calling thread whenever a job finishes.
+        Upon CTRL+C, no further jobs are started and all running commands are aborted. The KeyboardInterrupt is re-raised afterwards.
+        """
+        import concurrent.futures # only needed for --jobs, so it does not slow down the startup of run.py
+        pending = list(jobs)
+        pending.reverse() # we pop from the back
+        running = dict() # future -> (job, reserved memory)
+        busy_chains = set()
+        reservations = dict() # job -> memory reservation
+        free_memory = self.memory_budget
+        waiting_job, overtakes = None, 0 # the first startable job and how often it was overtaken
+
+        def find_next_job():
+            """ Returns the position of the next job that can be started (or None) and whether it overtakes the first startable job. """
+            nonlocal waiting_job, overtakes
+            first = None
+            for pos in range(len(pending) - 1, -1, -1):
+                job = pending[pos]
+                if self.get_chain is not None and self.get_chain(job) is not None and self.get_chain(job) in busy_chains: continue
+                if first is None:
+                    first = job
+                    if waiting_job != job: waiting_job, overtakes = job, 0
+                if self.memory_budget is None: return pos, False
+                if job not in reservations: reservations[job] = self.get_memory_reservation(job)
+                if reservations[job] <= free_memory: return pos, job != first
+                if overtakes >= self.max_overtakes: break # do not let the first startable job starve
+            return None, False
+
+        def select_next_job():
+            nonlocal overtakes
+            while True:
+                pos, overtaking = find_next_job()
+                if pos is None: return None
+                job = pending.pop(pos)
+                if self.skip_job is None or not self.skip_job(job):
+                    if overtaking: overtakes += 1
+                    return job
+                reservations.pop(job, None)
+
+        def finish(future):
+            nonlocal free_memory
+            job, reserved = running.pop(future)
+            if reserved is not None: free_memory += reserved
+            if self.get_chain is not None: busy_chains.discard(self.get_chain(job))
+            if on_done is not None: on_done(job, future.result() if future.exception() is None else None, future.exception())
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            try:
+                while len(pending) > 0 or len(running) > 0:
+                    while len(pending) > 0 and len(running) < self.num_workers:
+                        job = select_next_job()
+                        if job is None: break
+                        reserved = reservations.pop(job, None)
+                        if reserved is not None: free_memory -= reserved
+                        if self.get_chain is not None and self.get_chain(job) is not None: busy_chains.add(self.get_chain(job))
+                        running[pool.submit(run_job, job)] = (job, reserved)
+                    if len(running) == 0: continue # all remaining jobs were skipped
+                    done, _ = concurrent.futures.wait(running, timeout=1, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        finish(future)
+            except KeyboardInterrupt:
+                print("\nInterrupt: aborting {} running invocation(s) and skipping {} pending invocation(s)...".format(len(running), len(pending)))
+                abort_all_commands()
+                for future in concurrent.futures.as_completed(list(running)):
+                    finish(future)
+                raise
@@ -0,0 +1,97 @@
+import os, json, hashlib, heapq
+from collections import OrderedDict
+
+ORDERS = ["given", "sjf", "ljf"]
+
+def get_command_hash(invocation):
+    """ Returns a short hash of the commands of the given invocation, which identifies whether previous runtimes are still meaningful. """
+    return hashlib.sha1("\n".join(invocation["commands"]).encode('utf-8')).hexdigest()[:16]
+
+
+class RuntimeHistory(object):
+    """
+    Persistent database of the wallclock times of previous executions, keyed by invocation id and command hash.
+    The database is stored as a json file that maps invocation ids to a dictionary from command hashes to the last recorded runtime.
+    """
+    def __init__(self, path = None):
+        self.path = path
+        self.entries = OrderedDict() # invocation id -> command hash -> runtime entry
+        if path is not None and os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8-sig') as json_file:
+                self.entries = json.load(json_file, object_pairs_hook=OrderedDict)
+
+    def save(self):
+        if self.path is None: return
+        with open(self.path + ".tmp", 'w') as json_file:
+            json.dump(self.entries, json_file, ensure_ascii=False, indent='\t')
+        os.replace(self.path + ".tmp", self.path)
+
+    def record(self, result_json):
+        """ Records the runtime of the given execution result. Results without a runtime (e.g. pruned invocations) are ignored. """
+        if "wallclock-time" not in result_json: return
+        entry = OrderedDict()
+        entry["wallclock-time"] = result_json["wallclock-time"]
+        entry["timeout"] = result_json.get("timeout", False)
+        entry["time-limit"] = result_json["time-limit"]
+        self.entries.setdefault(result_json["id"], OrderedDict())[get_command_hash(result_json)] = entry
+
+    def import_log_dir(self, log_dir):
+        """ Records the runtimes of all execution results in the given log directory. Returns the number of recorded results. """
+        num_recorded = 0
+        for filename in sorted(os.listdir(log_dir)):
+            if not filename.endswith(".json"): continue
+            with open(os.path.join(log_dir, filename), 'r', encoding='utf-8-sig') as json_file:
+                result_json = json.load(json_file)
+            if not isinstance(result_json, dict) or "commands" not in result_json: continue # not an execution result
+            if "wallclock-time" in result_json: num_recorded += 1
+            self.record(result_json)
+        return num_recorded
+
+    def get_runtime(self, invocation):
+        """
+        Returns the expected wallclock time of the given invocation, or None if it never ran.
+        Runtimes recorded for the same commands take precedence over those of other commands with the same invocation id (e.g. with different paths).
+        Invocations that timed out previously are expected to run until their time limit, and no estimate exceeds the time limit.
+        """
+        runs = self.entries.get(invocation["id"])
+        if runs is None or len(runs) == 0: return None
+        entry = runs.get(get_command_hash(invocation), list(runs.values())[-1])
+        if entry["timeout"]: return invocation["time-limit"]
+        return min(entry["wallclock-time"], invocation["time-limit"])
+
+    def estimate_runtimes(self, invocations, invocation_indices):
+        """
+        Returns a dictionary with the expected wallclock time of each given invocation (including all repetitions) and the number of invocations without recorded runtime.
+        For the latter, the average runtime of the same configuration is taken (or the time limit if there is none).
+        """
+        estimates = OrderedDict()
+        config_runtimes = OrderedDict() # configuration id -> recorded runtimes
+        for i in invocation_indices:
+            estimates[i] = self.get_runtime(invocations[i])
+            if estimates[i] is not None: config_runtimes.setdefault(invocations[i]["configuration-id"], []).append(estimates[i])
+        num_unknown = 0
+        for i in invocation_indices:
+            if estimates[i] is not None: continue
+            num_unknown += 1
+            config_id = invocations[i]["configuration-id"]
+            if config_id in config_runtimes:
+                estimates[i] = min(sum(config_runtimes[config_id]) / len(config_runtimes[config_id]), invocations[i]["time-limit"])
+            else:
+                estimates[i] = invocations[i]["time-limit"]
+        for i in invocation_indices: # invocations might be executed several times
+            estimates[i] *= invocations[i].get("warmup-runs", 0) + invocations[i].get("repetitions", 1)
+        return estimates, num_unknown
+
+
+def order_invocations(invocation_indices, estimates, order):
+    """ Orders the given invocation indices according to their estimated runtimes: shortest first ('sjf'), longest first ('ljf'), or as given. """
+    assert order in ORDERS, f"Unknown order '{order}'"
+    if order == "given": return list(invocation_indices)
+    return sorted(invocation_indices, key=lambda i: estimates[i], reverse=(order == "ljf")) # sorting is stable, so ties keep the given order
+
+def predict_campaign_time(invocation_indices, estimates, num_jobs):
+    """ Predicts the wallclock time of the campaign when the invocations are started in the given order on num_jobs workers. """
+    workers = [0.0] * num_jobs
+    for i in invocation_indices:
+        heapq.heappush(workers, heapq.heappop(workers) + estimates[i]) # the next invocation starts on the worker that becomes free first
+    return max(workers)
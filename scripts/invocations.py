@@ -0,0 +1,127 @@
+import os, json, textwrap
+from array import array
+from collections import OrderedDict
+
+INDEX_SUFFIX = ".idx"
+
+def is_jsonl_file(path):
+    """ Returns True if the given invocations file is line-delimited (one invocation per line) rather than a legacy json array. """
+    with open(path, 'rb') as invocations_file:
+        for line in invocations_file:
+            if line.strip() != b"":
+                return not line.lstrip(b"\xef\xbb\xbf \t").startswith(b"[")
+    return path.endswith(".jsonl")
+
+def scan_line_offsets(invocations_file, offsets, start = 0):
+    """ Appends the offsets of the non-empty lines that start at or after the given position to offsets. Returns the position after the last complete line. """
+    invocations_file.seek(start)
+    position = start
+    for line in invocations_file:
+        if not line.endswith(b"\n"): break # incomplete line, e.g. while another process appends to the file
+        if line.strip() != b"": offsets.append(position)
+        position += len(line)
+    return position
+
+def load_index(path):
+    """
+    Returns the offsets of the invocations in the given jsonl file. They are stored in an index file next to it, which is created or extended if necessary.
+    The index starts with the inode of the file and the size of the indexed part, followed by the offsets.
+    Files are assumed to be append-only as long as they keep their inode: if the file grew, only the new part is indexed. Files that are replaced (see write_invocations) are indexed again.
+    """
+    index_path = path + INDEX_SUFFIX
+    stat = os.stat(path)
+    offsets = array('Q')
+    indexed_size = 0
+    if os.path.isfile(index_path):
+        index = array('Q')
+        with open(index_path, 'rb') as index_file:
+            index.frombytes(index_file.read())
+        if len(index) >= 2 and index[0] == stat.st_ino and index[1] <= stat.st_size:
+            offsets, indexed_size = index[2:], index[1]
+            if indexed_size == stat.st_size: return offsets
+    with open(path, 'rb') as invocations_file:
+        if indexed_size > 0:
+            invocations_file.seek(indexed_size - 1)
+            if invocations_file.read(1) != b"\n": # not a line end, so the file was modified
+                offsets, indexed_size = array('Q'), 0
+        indexed_size = scan_line_offsets(invocations_file, offsets, indexed_size)
+    save_index(path, stat.st_ino, offsets, indexed_size)
+    return offsets
+
+def save_index(path, inode, offsets, indexed_size):
+    index_path = path + INDEX_SUFFIX
+    tmp_path = f"{index_path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as index_file:
+        array('Q', [inode, indexed_size]).tofile(index_file)
+        offsets.tofile(index_file)
+    os.replace(tmp_path, index_path) # concurrent workers might build the same index
+
+
+class JsonlInvocations(object):
+    """
+    Invocations stored in a jsonl file (one invocation per line), which are read on demand.
+    An invocation is parsed when it is first accessed. Afterwards, the same object is returned, so modifications (e.g. of the limits) persist.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.offsets = load_index(path)
+        self.loaded = dict() # index -> invocation
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def read(self, invocations_file, i):
+        invocations_file.seek(self.offsets[i])
+        return json.loads(invocations_file.readline().decode('utf-8-sig'), object_pairs_hook=OrderedDict)
+
+    def __getitem__(self, i):
+        if i not in self.loaded:
+            if not 0 <= i < len(self.offsets): raise IndexError(f"Invocation index {i} is out of range.")
+            with open(self.path, 'rb') as invocations_file:
+                self.loaded[i] = self.read(invocations_file, i)
+        return self.loaded[i]
+
+    def __iter__(self):
+        """ Streams through the file instead of opening it for each invocation. """
+        with open(self.path, 'rb') as invocations_file:
+            for i in range(len(self.offsets)):
+                if i not in self.loaded: self.loaded[i] = self.read(invocations_file, i)
+                yield self.loaded[i]
+
+
+def load_invocations(path):
+    """ Loads the invocations of the given file, which is either a jsonl file (see JsonlInvocations) or a legacy json array. """
+    if is_jsonl_file(path):
+        return JsonlInvocations(path)
+    with open(path, 'r', encoding='utf-8-sig') as json_file:
+        return json.load(json_file, object_pairs_hook=OrderedDict)
+
+def write_invocations(invocations_json, path, append = False):
+    """
+    Writes the given invocations (e.g. a generator) while they are produced and returns the number of written invocations.
+    Files ending with '.jsonl' are written line-delimited together with their index and can be extended by appending. Other files are written as a json array.
+    """
+    num_invocations = 0
+    if path.endswith(".jsonl"):
+        if append and os.path.isfile(path):
+            assert is_jsonl_file(path), f"Can not append to the legacy invocations file {path}."
+            load_index(path) # indexes the existing invocations, so only the appended ones are scanned afterwards
+            mode, write_path = 'ab', path
+        else:
+            mode, write_path = 'wb', path + ".tmp"
+        with open(write_path, mode) as jsonl_file:
+            for inv_json in invocations_json:
+                jsonl_file.write((json.dumps(inv_json, ensure_ascii=False) + "\n").encode('utf-8'))
+                num_invocations += 1
+        if write_path != path: os.replace(write_path, path)
+        load_index(path)
+    else:
+        assert not append, f"Can only append to jsonl files, but got {path}."
+        with open(path + ".tmp", 'w') as json_file:
+            for inv_json in invocations_json:
+                json_file.write("[\n" if num_invocations == 0 else ",\n")
+                json_file.write(textwrap.indent(json.dumps(inv_json, ensure_ascii=False, indent='\t'), '\t'))
+                num_invocations += 1
+            json_file.write("[]" if num_invocations == 0 else "\n]")
+        os.replace(path + ".tmp", path)
+    return num_invocations
@@ -0,0 +1,96 @@
+import os, json, threading, time, socket
+from collections import OrderedDict
+
+JOURNAL_FILENAME = "journal.jsonl"
+STATUSES = ["ok", "error", "timeout", "memout", "pruned"]
+
+def get_result_status(result_json):
+    """ Classifies the result of an execution as either 'ok', 'error' (e.g. a crash), 'timeout', 'memout' (if the memory limit was enforced by the benchmarking tool) or 'pruned' (if it was not executed, see pruning.py). """
+    if "pruned" in result_json: return "pruned"
+    if result_json.get("timeout", False): return "timeout"
+    if result_json.get("memout", False): return "memout"
+    if result_json.get("execution-error", False): return "error"
+    return "ok"
+
+def get_result_file_path(invocation):
+    return os.path.join(invocation["log-dir"], os.path.splitext(invocation["log"])[0] + ".json")
+
+
+class Journal(object):
+    """
+    Append-only journal within a log directory that records which invocations were started and finished.
+    Each line is a json object, so a journal that was cut off by a preemption is still readable up to its last complete line.
+    """
+    def __init__(self, log_dir):
+        self.path = os.path.join(log_dir, JOURNAL_FILENAME)
+        self.lock = threading.Lock()
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as journal_file:
+                journal_file.write(line)
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+
+    def record_started(self, index, invocation):
+        self.append(OrderedDict(event="started", id=invocation["id"], index=index, time=time.time(), host=socket.gethostname(), pid=os.getpid()))
+
+    def record_finished(self, index, invocation, result_json):
+        self.append(OrderedDict(event="finished", id=invocation["id"], index=index, time=time.time(), status=get_result_status(result_json), wallclock=result_json.get("wallclock-time")))
+
+    def load(self):
+        """ Returns a dictionary mapping invocation ids to the status of their last recorded execution ('started' if it never finished). """
+        states = OrderedDict()
+        if not os.path.isfile(self.path): return states
+        with open(self.path, 'r', encoding='utf-8') as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue # incomplete line, e.g. due to a preemption while writing
+                states[entry["id"]] = entry["status"] if entry["event"] == "finished" else "started"
+        return states
+
+
+class JournalSet(object):
+    """ Maintains the journals of all log directories referenced by a set of invocations. """
+    def __init__(self):
+        self.journals = dict()
+        self.states = dict()
+        self.lock = threading.Lock()
+
+    def get(self, invocation):
+        with self.lock:
+            log_dir = invocation["log-dir"]
+            if log_dir not in self.journals:
+                self.journals[log_dir] = Journal(log_dir)
+                self.states[log_dir] = self.journals[log_dir].load()
+            return self.journals[log_dir]
+
+    def get_status(self, invocation):
+        """
+        Returns the status of the last execution of the given invocation (see STATUSES), 'started' if it was interrupted, or None if it never ran.
+        Invocations that are not in the journal (e.g. results from before journals were introduced) are classified based on their result file.
+        """
+        self.get(invocation)
+        status = self.states[invocation["log-dir"]].get(invocation["id"])
+        if status is None and os.path.isfile(get_result_file_path(invocation)):
+            with open(get_result_file_path(invocation), 'r', encoding='utf-8-sig') as json_file:
+                status = get_result_status(json.load(json_file))
+        return status
+
+    def get_invocations_to_run(self, invocations, invocation_indices, retry_statuses = []):
+        """ Filters the given indices, skipping invocations that already finished unless their status is among the ones to retry. """
+        result = []
+        skipped = OrderedDict([[s, 0] for s in STATUSES])
+        interrupted = 0
+        for i in invocation_indices:
+            status = self.get_status(invocations[i])
+            if status in STATUSES and status not in retry_statuses:
+                skipped[status] += 1
+                continue
+            if status == "started": interrupted += 1
+            result.append(i)
+        print("Resuming: skipping {} finished invocations ({}), re-running {} interrupted invocations.".format(sum(skipped.values()), ", ".join([f"{n} {s}" for s,n in skipped.items()]), interrupted))
+        return result
@@ -0,0 +1,73 @@
+import os, copy, fcntl, json, time
+
+from executing import execute_command_line, ABORT_REQUESTED, OUT_OF_MEMORY_OUTPUTS
+RETRY_FAILED_BUILDS = False # if True, models whose build failed before this process started are built again (see --rebuild-failed in run.py)
+START_TIME = time.time()
+
+def is_deterministic_failure(output, return_code):
+    """ Returns True if a build with the given output and return code failed in a way that will not change when building again, i.e., not due to a time limit, an abort, a signal or a lack of memory. """
+    if return_code is None or return_code <= 0 or ABORT_REQUESTED.is_set(): return False
+    return not any(message in output for message in OUT_OF_MEMORY_OUTPUTS) # builds that ran out of memory may succeed with more memory available
+
+def has_failed(model_cache, failed_path):
+    """
+    Returns True if the given marker records a failed build of the model with the same build command and time limit.
+    Outdated markers (and, with RETRY_FAILED_BUILDS, markers of earlier runs) are removed.
+    """
+    if not os.path.isfile(failed_path): return False
+    try:
+        with open(failed_path, 'r') as failed_file:
+            failure = json.load(failed_file)
+    except ValueError:
+        failure = {} # a marker of an earlier version
+    if failure.get("build-command") == model_cache["build-command"] and failure.get("time-limit") == model_cache["time-limit"]:
+        if not RETRY_FAILED_BUILDS or os.path.getmtime(failed_path) >= START_TIME: return True
+    os.remove(failed_path)
+    return False
+
+def build_model(model_cache):
+    """
+    Builds and exports the model described by the given 'model-cache' entry of an invocation (see commands.get_model_cache_entry), unless this already happened.
+    Concurrent workers (threads or processes) wait for each other via a lock file, so each model is built only once.
+    Builds that failed deterministically (see is_deterministic_failure) are not repeated as long as build command and time limit stay the same.
+    Returns True if the cached model is available.
+    """
+    model_path = model_cache["model"]
+    failed_path = model_path + ".failed"
+    if os.path.isfile(model_path): return True
+    with open(model_path + ".lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if os.path.isfile(model_path): return True # built by another worker while we were waiting
+            if has_failed(model_cache, failed_path):
+                print(f"WARN: Not loading cached model {model_path} since building it failed before (see {model_path}.build.log).")
+                return False
+            output, wall_time, return_code = execute_command_line(model_cache["build-command"], model_cache["time-limit"])
+            with open(model_path + ".build.log", 'w') as logfile:
+                logfile.write(f"Command:\t{model_cache['build-command']}\nWallclock time:\t{wall_time}\nReturn code:\t{return_code}\nOutput:\n{output}\n")
+            if return_code == 0 and os.path.isfile(model_cache["build-output"]):
+                os.replace(model_cache["build-output"], model_path)
+                return True
+            print(f"WARN: Unable to build cached model {model_path} (see {model_path}.build.log).")
+            if is_deterministic_failure(output, return_code):
+                with open(failed_path, 'w') as failed_file:
+                    json.dump({"build-command": model_cache["build-command"], "time-limit": model_cache["time-limit"], "return-code": return_code}, failed_file)
+            if os.path.isfile(model_cache["build-output"]): os.remove(model_cache["build-output"])
+            return False
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def prepare_invocation(invocation):
+    """
+    Makes sure that the cached model of the given invocation is built before it is executed.
+    Returns the invocation to execute, which falls back to the uncached commands if the model could not be built.
+    The time for building the model is not part of the measured wallclock time of the invocation.
+    """
+    if "model-cache" not in invocation: return invocation
+    model_cache = copy.copy(invocation["model-cache"])
+    model_cache.setdefault("time-limit", invocation["time-limit"])
+    if build_model(model_cache): return invocation
+    fallback = copy.deepcopy(invocation)
+    fallback["commands"] = model_cache["uncached-commands"]
+    del fallback["model-cache"]
+    return fallback
@@ -0,0 +1,63 @@
+import os, json, sqlite3
+from collections import OrderedDict
+
+from resultcache import get_file_hash
+
+PARSE_CACHE_VERSION = 1 # increase to invalidate all existing cache entries, e.g. when postprocess.parse_tool_output changes
+
+class ParseCache(object):
+    """
+    Persistent cache of parsed execution results (see postprocess.gather_execution_data), stored in an SQLite database.
+    Entries are keyed by the path of the result file. An entry is valid as long as the result file and its logfile keep their size and modification time.
+    If only the modification time changed (e.g. when the logs are unpacked again), the content hashes decide.
+    All entries are dropped when the given version (e.g. of the parsers of the tools) differs from the version the cache was created with.
+    """
+    def __init__(self, db_path, version):
+        if os.path.dirname(db_path) != "": os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.connection = sqlite3.connect(db_path, timeout=60)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (path TEXT PRIMARY KEY, json_size INTEGER, json_mtime INTEGER, json_hash TEXT, "
+                                "log_name TEXT, log_size INTEGER, log_mtime INTEGER, log_hash TEXT, result TEXT, output TEXT)")
+        version = f"{PARSE_CACHE_VERSION}:{version}"
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != version:
+            if row is not None: print("Parser version changed, dropping the parse cache.")
+            self.connection.execute("DELETE FROM results")
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+        self.connection.commit()
+
+    def get_change(self, path, size, mtime, file_hash):
+        """ Returns None if the given file still has the given size and modification time, "mtime" if only its modification time changed, and "content" otherwise. """
+        if not os.path.isfile(path): return "content"
+        stat = os.stat(path)
+        if stat.st_size == size and stat.st_mtime_ns == mtime: return None
+        return "mtime" if stat.st_size == size and get_file_hash(path) == file_hash else "content"
+
+    def lookup(self, path):
+        """ Returns the cached execution result of the given result file and the output printed while parsing it, or None if there is no valid entry. """
+        key = os.path.abspath(path)
+        row = self.connection.execute("SELECT json_size, json_mtime, json_hash, log_name, log_size, log_mtime, log_hash, result, output FROM results WHERE path = ?", (key,)).fetchone()
+        if row is None: return None
+        json_size, json_mtime, json_hash, log_name, log_size, log_mtime, log_hash, result, output = row
+        log_path = os.path.join(os.path.dirname(path), log_name)
+        changes = [self.get_change(path, json_size, json_mtime, json_hash), self.get_change(log_path, log_size, log_mtime, log_hash)]
+        if "content" in changes: return None
+        if "mtime" in changes: self.store(path, log_name, result, output) # so the next lookup does not need the hashes
+        execution_json = json.loads(result, object_pairs_hook=OrderedDict)
+        execution_json["log"] = log_path
+        return execution_json, output
+
+    def insert(self, path, execution_json, output):
+        """ Adds the given parsed execution result of the given result file. Its logfile must be parsed (and possibly modified) already. """
+        log_name = os.path.relpath(execution_json["log"], os.path.dirname(path))
+        self.store(path, log_name, json.dumps(execution_json, ensure_ascii=False), output)
+
+    def store(self, path, log_name, result, output):
+        log_path = os.path.join(os.path.dirname(path), log_name)
+        json_stat, log_stat = os.stat(path), os.stat(log_path)
+        self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (os.path.abspath(path), json_stat.st_size, json_stat.st_mtime_ns, get_file_hash(path), log_name, log_stat.st_size, log_stat.st_mtime_ns, get_file_hash(log_path), result, output))
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
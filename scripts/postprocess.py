@@ -1,10 +1,13 @@
-import sys, os, json, csv, copy, math, re, itertools, html
+import sys, os, json, csv, copy, math, re, itertools, html, io, contextlib, multiprocessing, concurrent.futures
 
 from collections import Counter, OrderedDict
 import benchmarks
 from tools import *
+from parsecache import ParseCache
 
 OUT_DIR = "data"
+JOBS = os.cpu_count() # number of worker processes for parsing the logfiles
+PARSE_CACHE_FILE = "parse-cache.sqlite" # within OUT_DIR
 
 def load_json(path : str):
     with open(path, 'r', encoding='utf-8-sig') as json_file:
@@ -78,10 +81,15 @@ def save_html(table_data, num_tool_configs, path):
             write_line(f, indention, '<div class="boxlabelo"><div class="boxlabelc">Execution</div></div>')
             write_line(f, indention, '<table style="margin-bottom: 0.75ex;">')
             indention += 1
-            if result_json["timeout"]:
+            if "pruned" in result_json:
+                write_line(f, indention, '<tr><td>Walltime:</td><td>Not executed (pruned due to {} of {})</td></tr>'.format(result_json["pruned"], result_json["pruned-by"]))
+            elif result_json["timeout"]:
                 write_line(f, indention, '<tr><td>Walltime:</td><td style="color: red;">&gt {}s (Timeout)</td></tr>'.format(result_json["time-limit"]))
             else:
                 write_line(f, indention, '<tr><td>Walltime:</td><td style="tt">{}s</td></tr>'.format(result_json["wallclock-time"]))
+                if "wallclock-time-samples" in result_json:
+                    write_line(f, indention, '<tr><td>Repetitions:</td><td style="tt">{} (median {:.3f}s, min {:.3f}s, 95% CI [{:.3f}s, {:.3f}s])</td></tr>'.format(len(result_json["wallclock-time-samples"]), result_json["wallclock-time-median"], result_json["wallclock-time-min"], *result_json["wallclock-time-ci"]))
+                    write_line(f, indention, '<tr><td>Samples:</td><td style="tt">{}</td></tr>'.format(", ".join([f"{t:.3f}s" for t in result_json["wallclock-time-samples"]])))
                 if "model-checking-time" in result_json:
                     write_line(f, indention, '<tr><td>Model Checking Walltime:</td><td style="tt">{}s</td></tr>'.format(result_json["model-checking-time"]))
                 return_codes = []
@@ -91,6 +99,12 @@ def save_html(table_data, num_tool_configs, path):
                     write_line(f, indention, '<tr><td>Return code:</td><td style="tt; color: red;">{}</td></tr>'.format(", ".join([str(rc) for rc in return_codes])))
                 else:
                     write_line(f, indention, '<tr><td>Return code:</td><td style="tt">{}</td></tr>'.format(", ".join([str(rc) for rc in return_codes])))
+            if "batch-of" in result_json: # the walltime is not measured directly but composed of the times that storm reports for the model construction and the analysis of the property
+                write_line(f, indention, '<tr><td>Batched:</td><td>Executed within {}{}</td></tr>'.format(result_json["batch-of"], ", analysis of the property took {}s".format(result_json["analysis-time"]) if "analysis-time" in result_json else ""))
+            if "peak-memory" in result_json:
+                write_line(f, indention, '<tr><td>Peak memory:</td><td style="tt">{:.1f}MB</td></tr>'.format(result_json["peak-memory"]))
+                write_line(f, indention, '<tr><td>CPU time:</td><td style="tt">{:.2f}s user, {:.2f}s system</td></tr>'.format(result_json["user-time"], result_json["system-time"]))
+                write_line(f, indention, '<tr><td>Page faults:</td><td style="tt">{} major, {} minor</td></tr>'.format(result_json["major-page-faults"], result_json["minor-page-faults"]))
             first = True
             for note in result_json["notes"]:
                 write_line(f, indention, '<tr><td>{}</td><td>{}</td></tr>'.format("Note(s):" if first else "", note))
@@ -157,15 +171,21 @@ def save_html(table_data, num_tool_configs, path):
           // Remove old best ones
           table.cells().every( function() {
             $(this.node()).removeClass("best");
+            $(this.node()).removeClass("noisybest");
           });
           table.rows().every( function ( rowIdx, tableLoop, rowLoop ) {
               var bestValue = -1
               var bestIndex = -1
+              var intervals = {}
               $.each( this.data(), function( index, value ){
                 if (index >= """ + str(first_tool_col) + """ && table.column(index).visible()) {
     			    var text = $(value).text()
-    	            if (["TO", "ERR", "INC", "MO", "NS", ""].indexOf(text) < 0) {
+    	            if (["TO", "ERR", "INC", "MO", "NS", "PR", ""].indexOf(text) < 0) {
     				    var number = parseFloat(text);
+    				    var ci = $(value).attr("data-ci");
+    				    if (ci !== undefined) {
+    				      intervals[index] = ci.split(",").map(parseFloat);
+    				    }
     	                if (bestValue == -1 || bestValue > number) {
     	                  // New best value
     	                  bestValue = number;
@@ -177,6 +197,14 @@ def save_html(table_data, num_tool_configs, path):
               // Set new best
               if (bestIndex >= 0) {
                 $(table.cell(rowIdx, bestIndex).node()).addClass("best");
+                // Flag values that can not be distinguished from the best one due to measurement noise (overlapping confidence intervals)
+                if (bestIndex in intervals) {
+                  $.each( intervals, function( index, ci ){
+                    if (index != bestIndex && ci[0] <= intervals[bestIndex][1] && intervals[bestIndex][0] <= ci[1]) {
+                      $(table.cell(rowIdx, index).node()).addClass("noisybest");
+                    }
+                  });
+                }
               }
           } );
       }
@@ -208,8 +236,10 @@ def save_html(table_data, num_tool_configs, path):
                     cell_content = ""
                 elif type(cell_content) == list:
                     logpage = create_log_page(cell_content[1])
-                    style_classes = dict(TO="timeout", ERR="error", INC="incorrect", MO="memout", NS="unsupported")
+                    style_classes = dict(TO="timeout", ERR="error", INC="incorrect", MO="memout", NS="unsupported", PR="pruned")
                     link_attributes = "class='{}'".format(style_classes[cell_content[0]]) if cell_content[0] in style_classes else ""
+                    if "wallclock-time-ci" in cell_content[1]:
+                        link_attributes += " data-ci='{},{}'".format(*cell_content[1]["wallclock-time-ci"])
                     cell_content = "<a href='{}' {}>{}</a>".format(logpage, link_attributes, cell_content[0])
                 write_line(tablefile, indention, f'<td>{cell_content}</td>')
             indention -= 1
@@ -280,6 +310,9 @@ def save_html(table_data, num_tool_configs, path):
     .best {
         background-color: lightgreen;
     }
+    .noisybest {
+        background-color: palegreen;
+    }
     .error {
     	font-weight: bold;
     	background-color: lightcoral;
@@ -294,6 +327,9 @@ def save_html(table_data, num_tool_configs, path):
     .memout {
         background-color: lightgray;
     }
+    .pruned {
+        background-color: lightgray;
+    }
     .unsupported {
         background-color: yellow;
     }
@@ -349,21 +385,27 @@ def save_latex(table_data, cols, header, path):
 def parse_tool_output(execution_json):
     with open(execution_json["log"], 'r') as logfile:
         log = logfile.read()
+    original_log = log
     execution_json["notes"] = [execution_json["invocation-note"]]
     execution_json["benchmark"] = benchmarks.from_id(execution_json["benchmark-id"])
 
     assert execution_json["tool"] in TOOL_NAMES, "Error: Unknown tool '{}'".format(execution_json["tool"])
     tool = TOOL_NAMES[execution_json["tool"]]
     execution_json["configuration"] = tool.config_from_id(execution_json["configuration-id"])
-    tool.parse_logfile(log, execution_json)
+    if "pruned" in execution_json: # the invocation was not executed (see run.py --prune)
+        execution_json["notes"].append("Pruned due to {} of {}.".format(execution_json["pruned"], execution_json["pruned-by"]))
+        for key in ["not-supported", "timeout", "memout", "expected-error"]: execution_json[key] = False
+    else:
+        tool.parse_logfile(log, execution_json)
 
     # modify logfile
     NOTES_HEADING = "\n" + "#"*30 + " Notes " + "#"*30 + "\n"
     posEnd = log.find(NOTES_HEADING)
     if posEnd >= 0: log = log[:posEnd]
     if len(execution_json["notes"]) > 0: log += NOTES_HEADING + "\n".join(execution_json["notes"]) + "\n"
-    with open(execution_json["log"], 'w') as logfile:
-        logfile.write(log)
+    if log != original_log: # unchanged logfiles keep their modification time (see ParseCache)
+        with open(execution_json["log"], 'w') as logfile:
+            logfile.write(log)
 
 # stores benchmark-instance specific data from the execution. Reports inconsistencies with other executions on the same instance
 def process_benchmark_instance_data(benchmark_instances, execution_json):
@@ -419,37 +461,81 @@ def process_benchmark_instance_data(benchmark_instances, execution_json):
                 else:
                     benchmark_instances[bench_id][key] = bench_data[key]
 
-def gather_execution_data(logdirs, silent=False):
+def ingest_result_file(path):
+    """
+    Loads the given result file and parses its logfile (in a worker process of gather_execution_data).
+    Returns the execution result, or None if it is skipped, together with the output printed meanwhile.
+    The benchmark instance and the configuration are left out of the result, as the merging process looks them up itself.
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        execution_json = load_json(path)
+        if "batch" in execution_json: return None, output.getvalue() # the results of the batched invocations are stored separately
+        benchmark = execution_json["benchmark-id"]
+        if benchmark not in benchmarks.INSTANCES_BY_ID:
+            print(f"WARN: Ignoring data for unknown benchmark {benchmark}")
+            return None, output.getvalue()
+        execution_json["log"] = os.path.join(os.path.dirname(path), execution_json["log"])
+        try:
+            parse_tool_output(execution_json)
+        except AssertionError as e:
+            print("Error when parsing logfile {}:\n{}".format(execution_json["log"], e))
+            execution_json["parse-error"] = True
+        execution_json["benchmark"] = execution_json["configuration"] = None
+    return execution_json, output.getvalue()
+
+def get_parser_version():
+    return ",".join([f"{name}={tool.PARSER_VERSION}" for name, tool in TOOL_NAMES.items()])
+
+def gather_execution_data(logdirs, silent=False, jobs=None, parse_cache=None):
+    """
+    Gathers the execution results in the given log directories. The logfiles are parsed by the given number of worker processes (default: JOBS), which are forked so that they know all registered benchmark instances.
+    If a parse cache file is given, only new or changed results are parsed (see ParseCache).
+    """
     exec_data = OrderedDict() # Tool -> Config -> Benchmark -> Data
     benchmark_instances = OrderedDict() # ID -> data
-
-    for logdir_input in logdirs:
-        logdir = os.path.expanduser(logdir_input)
-        if not os.path.isdir(logdir):
-            print("Error: Directory '{}' does not exist.".format(logdir))
-
-        print("\nGathering execution data for logfiles in {} ...".format(logdir))
-        json_files = [ f for f in os.listdir(logdir) if f.endswith(".json") and os.path.isfile(os.path.join(logdir, f)) ]
-        i = 0
-        for execution_json in [ load_json(os.path.join(logdir, f)) for f in json_files ]:
-            benchmark = execution_json["benchmark-id"]
-            if benchmarks.from_id(benchmark) is None:
-                print(f"WARN: Ignoring data for unknown benchmark {benchmark}")
-                continue
-            i += 1
-            tool = execution_json["tool"]
-            config = execution_json["configuration-id"]
-            exec_data.setdefault(tool, OrderedDict())
-            exec_data[tool].setdefault(config, OrderedDict())
-            assert benchmark not in exec_data[tool][config], "Error: Multiple result files found for {}.{}.{}".format(tool,config,benchmark)
-            execution_json["log"] = os.path.join(logdir, execution_json["log"])
-            try:
-                parse_tool_output(execution_json)
-            except AssertionError as e:
-                print("Error when parsing logfile {}:\n{}".format(execution_json["log"], e))
-                continue
-            exec_data[tool][config][benchmark] = execution_json
-            process_benchmark_instance_data(benchmark_instances, execution_json)
+    jobs = JOBS if jobs is None else jobs
+
+    with contextlib.ExitStack() as stack:
+        executor = stack.enter_context(concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("fork"))) if jobs > 1 else None
+        cache = ParseCache(parse_cache, get_parser_version()) if parse_cache is not None else None
+        if cache is not None: stack.callback(cache.close)
+        for logdir_input in logdirs:
+            logdir = os.path.expanduser(logdir_input)
+            if not os.path.isdir(logdir):
+                print("Error: Directory '{}' does not exist.".format(logdir))
+
+            print("\nGathering execution data for logfiles in {} ...".format(logdir))
+            json_paths = [ os.path.join(logdir, f) for f in os.listdir(logdir) if f.endswith(".json") and os.path.isfile(os.path.join(logdir, f)) ]
+            cached = [cache.lookup(path) if cache is not None else None for path in json_paths]
+            cached = [c if c is None or c[0]["benchmark-id"] in benchmarks.INSTANCES_BY_ID else None for c in cached]
+            parse_paths = [path for path, c in zip(json_paths, cached) if c is None]
+            if cache is not None: print(f"Reusing {len(json_paths) - len(parse_paths)} cached results, parsing {len(parse_paths)} results.")
+            if executor is None:
+                parsed = map(ingest_result_file, parse_paths)
+            else:
+                parsed = executor.map(ingest_result_file, parse_paths, chunksize=max(1, len(parse_paths) // (4 * jobs)))
+            # merge the results in the order of the files
+            for path, cached_result in zip(json_paths, cached):
+                if cached_result is None:
+                    execution_json, output = next(parsed)
+                    if cache is not None and execution_json is not None: cache.insert(path, execution_json, output)
+                else:
+                    execution_json, output = cached_result
+                print(output, end="")
+                if execution_json is None: continue
+                tool = execution_json["tool"]
+                config = execution_json["configuration-id"]
+                benchmark = execution_json["benchmark-id"]
+                exec_data.setdefault(tool, OrderedDict())
+                exec_data[tool].setdefault(config, OrderedDict())
+                assert benchmark not in exec_data[tool][config], "Error: Multiple result files found for {}.{}.{}".format(tool,config,benchmark)
+                if execution_json.get("parse-error", False): continue
+                execution_json["benchmark"] = benchmarks.from_id(benchmark)
+                execution_json["configuration"] = TOOL_NAMES[tool].config_from_id(config)
+                exec_data[tool][config][benchmark] = execution_json
+                if "pruned" not in execution_json:
+                    process_benchmark_instance_data(benchmark_instances, execution_json)
 
     # warn for missing configs:
     if not silent:
@@ -467,11 +553,11 @@ def process_meta_configs(exec_data, benchmark_instances):
             benchmark_data = OrderedDict()
             for benchmark in benchmark_instances:
                 best_cfg_id = None
-                for cfg_id in exec_data[tool]:
-                    if cfg_id in [c["id"] for c in TOOL_NAMES[tool].META_CONFIGS]: continue
-                    if not cfg_id.startswith(metacfg["cfgbase"]): continue
-                    if benchmark not in  exec_data[tool][cfg_id]: continue
+                for cfg in TOOL_NAMES[tool].CONFIGS_BY_FAMILY[metacfg["cfgbase"]]:
+                    cfg_id = cfg["id"]
+                    if cfg_id not in exec_data[tool] or benchmark not in exec_data[tool][cfg_id]: continue
                     data = exec_data[tool][cfg_id][benchmark]
+                    if "pruned" in data: continue
                     if "maxtime" in metacfg and data["wallclock-time"] > metacfg["maxtime"]: continue
                     if not "result" in data: continue
                     result_str = data["result"]
@@ -492,6 +578,11 @@ def process_meta_configs(exec_data, benchmark_instances):
                 if best_cfg_id is not None: benchmark_data[benchmark] = copy.deepcopy(exec_data[tool][best_cfg_id][benchmark])
             exec_data[tool][metacfg["id"]] = benchmark_data
 
+def is_within_noise(result_a, result_b):
+    """ Returns True if the wallclock times of the given results can not be distinguished due to measurement noise, i.e., if the confidence intervals of their repetitions overlap. """
+    if result_a is None or result_b is None or "wallclock-time-ci" not in result_a or "wallclock-time-ci" not in result_b: return False
+    return result_a["wallclock-time-ci"][0] <= result_b["wallclock-time-ci"][1] and result_b["wallclock-time-ci"][0] <= result_a["wallclock-time-ci"][1]
+
 def get_result(exec_data, tool, config, inst_id):
         if tool in exec_data and config in exec_data[tool] and inst_id in exec_data[tool][config]:
             return exec_data[tool][config][inst_id]
@@ -569,7 +660,9 @@ def export_data(exec_data, benchmark_instances, export_kinds, prefix=""):
         tool = column[0]
         if tool in TOOL_NAMES: # the column is assumed to be a [tool, config, data_key] list, where data_key is the cell content key
             res = get_result_if_supported(exec_data, tool, column[1], inst)
-            if res is None:
+            if kind == "memory": # the resource usage is also of interest for executions without a result (e.g. timeouts)
+                value = "NS" if res is None else res.get(column[2], "nan")
+            elif res is None:
                 if kind in ["default", "html"]:
                     value = "NS"
                 elif kind in ["scatter"]:
@@ -578,6 +671,15 @@ def export_data(exec_data, benchmark_instances, export_kinds, prefix=""):
                     value = r"\multicolumn{1}{c}{-}"
                 elif kind in ["quantile"]:
                     value = math.inf
+            elif "pruned" in res:
+                if kind in ["default", "html"]:
+                    value = "PR"
+                elif kind.startswith("latex"):
+                    value = "PR"
+                elif kind in ["scatter"]:
+                    value = scatter_special_value(1)
+                elif kind in ["quantile"]:
+                    value = math.inf
             elif res["timeout"] == True:
                 if kind in ["default", "html"]:
                     value = "TO"
@@ -674,7 +776,7 @@ def export_data(exec_data, benchmark_instances, export_kinds, prefix=""):
         else:
             header = [c[0] for c in columns[:-len(cfgs)]]
             if len(cfgs) > 0: header += [f"{c[0]}.{c[1]}" for c in columns[-len(cfgs):]]
-            rows = [i["id"] for i in benchmarks.INSTANCES if i["id"] in benchmark_instances]
+            rows = sorted([i for i in benchmark_instances if i in benchmarks.INSTANCE_POSITIONS], key=benchmarks.INSTANCE_POSITIONS.get) # in the order of benchmarks.INSTANCES
             cells = [header]
             for inst in rows:
                 cells.append([])
@@ -712,21 +814,16 @@ def export_data(exec_data, benchmark_instances, export_kinds, prefix=""):
                             elif res_j == res_best:
                                 if is_upper: best_upper_indices.append(j)
                                 else: best_lower_indices.append(j)
-                    # now filter to find the best runtimes
+                    # now filter to find the best runtimes: the fastest one and all that tie with it, possibly within the measurement noise
                     for indices in [best_lower_indices, best_upper_indices]:
-                        best_time = None
-                        best_indices = []
+                        if len(indices) == 0: continue
+                        times = OrderedDict()
                         for j in indices:
-                            time_j = get_cell_content(columns[j], inst, "default")
-                            assert(type(time_j) == float), f"Unexpected content for time cell: {time_j}"
-                            if best_time is None:
-                                best_time = time_j
-                                best_indices = [j]
-                            elif to_latex(time_j, "time") == to_latex(best_time, "time"):
-                                best_indices.append(j)
-                            elif time_j < best_time:
-                                best_time = time_j
-                                best_indices = [j]
+                            times[j] = get_cell_content(columns[j], inst, "default")
+                            assert(type(times[j]) == float), f"Unexpected content for time cell: {times[j]}"
+                        fastest = min(indices, key=lambda j: times[j])
+                        fastest_res = get_result(exec_data, columns[fastest][0], columns[fastest][1], inst)
+                        best_indices = [j for j in indices if to_latex(times[j], "time") == to_latex(times[fastest], "time") or is_within_noise(get_result(exec_data, columns[j][0], columns[j][1], inst), fastest_res)]
                         for j in best_indices:
                             cells[-1][j] = f"\\textbf{{{cells[-1][j]}}}"
 
@@ -754,7 +851,7 @@ def export_data(exec_data, benchmark_instances, export_kinds, prefix=""):
         datalist = []
         is_increasing = False
         is_decreasing = False
-        for cfg in [c for c in storm.CONFIGS if c["id"].startswith(cfgbase)]:
+        for cfg in storm.CONFIGS_BY_FAMILY[cfgbase]:
             res = get_result_if_supported(exec_data, storm.NAME, cfg["id"], inst_id)
             if res is not None and "result" in res:
                 assert res["result"][:2] in ["≤ ", "≥ "], f"Unexpected result string: {res['result']}"
@@ -851,10 +948,10 @@ def export_data(exec_data, benchmark_instances, export_kinds, prefix=""):
         else:
             cols = [["name"], ["par"], ["states"], ["choices"], ["observations"], ["property"], ["dim"], ["num-epochs"], ["unf-states"], ["caunf-states"]]
             cfgs = [ [tool.NAME, c["id"]] for tool in TOOLS  for c in tool.CONFIGS + tool.META_CONFIGS ]
-            cols += [[c[0], c[1], "wallclock-time"] for c in cfgs]
+            cols += [[c[0], c[1], "peak-memory" if kind == "memory" else "wallclock-time"] for c in cfgs]
             # create and export different kinds of data
             cells = create_cells(cols, cfgs, kind)
-            if kind in ["default", "scatter", "quantile"]:
+            if kind in ["default", "scatter", "quantile", "memory"]:
                 save_csv(cells, os.path.join(OUT_DIR, f"{prefix}{kind}.csv"))
             elif kind == "html":
                 save_html(cells, len(cfgs), os.path.join(OUT_DIR, f"{prefix}table"))
@@ -867,7 +964,7 @@ def export_data(exec_data, benchmark_instances, export_kinds, prefix=""):
     create_time_result_csv()
 
 
-def get_lvlbnd_result_list_for_plot(cfg_id, instances, kind):
+def get_lvlbnd_result_list_for_plot(exec_data, cfg_id, instances, kind):
     min_kind_value = 0
     max_kind_value = 300 if kind == "lvls" else 300 # TODO
     datalist = []
@@ -881,9 +978,9 @@ def get_lvlbnd_result_list_for_plot(cfg_id, instances, kind):
             is_decreasing = is_decreasing or res["result"][:2] == "≤ " # upper bounds should be decreasing over time
             assert not is_increasing or not is_decreasing, f"Unexpected result string: {res['result']}"
             if kind == "lvls":
-                kind_value = benchmark_instances[inst_id]["bnd-thresholds"][0] / benchmark_instances[inst_id]["lvl-width"][0] # TODO: only looks at first value, discard other lvl widths
+                kind_value = instances[inst_id]["bnd-thresholds"][0] / instances[inst_id]["lvl-width"][0] # TODO: only looks at first value, discard other lvl widths
             else:
-                kind_value = benchmark_instances[inst_id]["bnd-thresholds"][0]
+                kind_value = instances[inst_id]["bnd-thresholds"][0]
             datalist.append((kind_value, float(res["result"][2:])))
     datalist = sorted(datalist)
     if len(datalist) == 0: return []
@@ -908,8 +1005,8 @@ def create_lvlbnd_result_csv(exec_data, instances, kind):
     column_contents = []
     for cfg, inst_name in itertools.product(storm.META_CONFIGS, instance_names):
         header += [f"{cfg['id']}.{inst_name}.{postfix}" for postfix in [kind, "result"]]
-        instance_subset = {b_id: b_data for b_id, b_data in instances.items() if b_data["name"] == inst_name}
-        column_contents.append(get_lvlbnd_result_list_for_plot(cfg["id"], instance_subset,  kind))
+        instance_subset = {inst["id"]: instances[inst["id"]] for inst in benchmarks.INSTANCES_BY_NAME.get(inst_name, []) if inst["id"] in instances}
+        column_contents.append(get_lvlbnd_result_list_for_plot(exec_data, cfg["id"], instance_subset,  kind))
 
     table = [header]
     num_rows = max([len(c) for c in column_contents])
@@ -929,40 +1026,47 @@ def create_lvlbnd_result_csv(exec_data, instances, kind):
 
 
 
+def save_execution_data(exec_data, benchmark_instances):
+    if not os.path.exists(OUT_DIR): os.makedirs(OUT_DIR)
+    save_json(exec_data, os.path.join(OUT_DIR, "execution-data.json"))
+    save_json(benchmark_instances, os.path.join(OUT_DIR, "benchmark-data.json"))
+
+def export_all(exec_data, benchmark_instances):
+    for b_id, b_data in benchmark_instances.items():
+        if "benchmark-set" not in b_data: print(b_data.keys())
+    def get_benchmark_subset(subset):
+        subset_ids = set([inst["id"] for bset in subset for inst in benchmarks.INSTANCES_BY_SET.get(bset, [])])
+        return {b_id: b_data for b_id, b_data in benchmark_instances.items() if b_id in subset_ids}
+
+    export_kinds = ["default", "scatter", "quantile", "memory", "html", "latexbenchmarks"] + [f"latext{t}" for t in storm.META_CONFIG_TIMELIMITS] + ["latexunf", "latexcaunf", "latexbelseq"]
+    export_data(exec_data, get_benchmark_subset(["main"]), export_kinds)
+    export_data(exec_data, get_benchmark_subset(["lvls"]), ["html"], prefix="lvls")
+    export_data(exec_data, get_benchmark_subset(["bnds"]), ["html"], prefix="bnds")
+    # export_data(exec_data, get_benchmark_subset(["unb"]), export_kinds)
+    create_lvlbnd_result_csv(exec_data,  get_benchmark_subset(["lvls"]), "lvls")
+    create_lvlbnd_result_csv(exec_data,  get_benchmark_subset(["bnds"]), "bnds")
+
 if __name__ == "__main__":
     print("Benchmarking tool.")
     print("This script gathers data of executions and exports them in various ways.")
     print("Usages:")
     print("python3 {} path/to/first/logfiles/ path/to/second/logfiles/ ...    reads from multiple log file directories '".format(sys.argv[0]))
+    print("python3 {} --jobs <n> path/to/logfiles/ ...    parses the logfiles with <n> worker processes (default: number of CPUs)".format(sys.argv[0]))
+    print("Parsed results are cached in {}, so only new or changed results are parsed again. Delete this file to parse all results again.".format(os.path.join(OUT_DIR, PARSE_CACHE_FILE)))
     print("")
     if (len(sys.argv) == 2 and sys.argv[1] in ["-h", "-help", "--help"]):
         exit(1)
 
     logdirs = sys.argv[1:]
+    jobs = None
+    if len(logdirs) >= 2 and logdirs[0] == "--jobs": jobs, logdirs = int(logdirs[1]), logdirs[2:]
 
     print("Selected log dir(s): {}".format(", ".join(logdirs)))
     print("")
 
-    exec_data, benchmark_instances = gather_execution_data(logdirs)
+    exec_data, benchmark_instances = gather_execution_data(logdirs, jobs=jobs, parse_cache=os.path.join(OUT_DIR, PARSE_CACHE_FILE))
     benchmark_instances = OrderedDict(sorted(benchmark_instances.items(), key=lambda item: item[0]))
     process_meta_configs(exec_data, benchmark_instances)
-
-    if not os.path.exists(OUT_DIR): os.makedirs(OUT_DIR)
-    save_json(exec_data, os.path.join(OUT_DIR, "execution-data.json"))
-    save_json(benchmark_instances, os.path.join(OUT_DIR, "benchmark-data.json"))
-
+    save_execution_data(exec_data, benchmark_instances)
     print("Found Data for {} benchmarks".format(len(benchmark_instances)))
-
-    for b_id, b_data in benchmark_instances.items():
-        if "benchmark-set" not in b_data: print(b_data.keys())
-    def get_benchmark_subset(subset):
-        return {b_id: b_data for b_id, b_data in benchmark_instances.items() if b_data["benchmark-set"] in subset}
-
-
-    export_kinds = ["default", "scatter", "quantile", "html", "latexbenchmarks"] + [f"latext{t}" for t in storm.META_CONFIG_TIMELIMITS] + ["latexunf", "latexcaunf", "latexbelseq"]
-    export_data(exec_data, get_benchmark_subset(["main"]), export_kinds)
-    export_data(exec_data, get_benchmark_subset(["lvls"]), ["html"], prefix="lvls")
-    export_data(exec_data, get_benchmark_subset(["bnds"]), ["html"], prefix="bnds")
-    # export_data(exec_data, get_benchmark_subset(["unb"]), export_kinds)
-    create_lvlbnd_result_csv(exec_data,  get_benchmark_subset(["lvls"]), "lvls")
-    create_lvlbnd_result_csv(exec_data,  get_benchmark_subset(["bnds"]), "bnds")
+    export_all(exec_data, benchmark_instances)
@@ -0,0 +1,180 @@
+import sys, os, json, copy, time, tarfile, tempfile, shutil, argparse, statistics, tracemalloc, contextlib, subprocess, resource
+from collections import OrderedDict
+
+import benchmarks
+import postprocess
+from executing import replace_placeholders_in_cmd_string
+
+DEFAULT_ARCHIVE = "$BENCH_HOME/experiments/logs.tar.gz"
+STAGES = ["gather", "meta", "save", "export"]
+STARTUP_COMMANDS = OrderedDict([["run.py", ["run.py", "--help"]]]) # the startup of a fresh python process for each invocation, e.g. in array jobs
+
+def get_copy_id(identifier, copy_index):
+    """ Returns the identifier of the given copy of a benchmark instance. Copy 0 is the original. """
+    return identifier if copy_index == 0 else f"{identifier}-copy{copy_index}"
+
+def register_instance_copies(num_copies):
+    """ Registers num_copies - 1 synthetic copies of each benchmark instance, so that copies of execution results can be attributed to them. """
+    original_instances = [inst for inst in benchmarks.INSTANCES if "-copy" not in inst["id"]]
+    for copy_index in range(1, num_copies):
+        for inst in original_instances:
+            if get_copy_id(inst["id"], copy_index) in benchmarks.INSTANCES_BY_ID: continue
+            inst_copy = copy.deepcopy(inst)
+            inst_copy["id"] = get_copy_id(inst["id"], copy_index)
+            benchmarks.register_instance(inst_copy)
+
+def create_log_dirs(archive, work_dir, num_copies):
+    """
+    Unpacks the archive into the work directory and creates num_copies - 1 synthetic copies of each log directory, in which the execution results refer to copies of the benchmark instances.
+    Returns the created log directories.
+    """
+    archive_dir = os.path.join(work_dir, "archive")
+    if not os.path.isdir(archive_dir):
+        with tarfile.open(archive, 'r:gz') as tar:
+            tar.extractall(archive_dir)
+    log_dirs = []
+    for logdir in sorted(os.listdir(archive_dir)):
+        for copy_index in range(num_copies):
+            copy_dir = os.path.join(work_dir, f"copy{copy_index}", logdir)
+            log_dirs.append(copy_dir)
+            if os.path.isdir(copy_dir): continue
+            shutil.copytree(os.path.join(archive_dir, logdir), copy_dir + ".tmp")
+            if copy_index > 0:
+                for filename in os.listdir(copy_dir + ".tmp"):
+                    if not filename.endswith(".json"): continue
+                    path = os.path.join(copy_dir + ".tmp", filename)
+                    execution_json = postprocess.load_json(path)
+                    execution_json["id"] = get_copy_id(execution_json["id"], copy_index)
+                    execution_json["benchmark-id"] = get_copy_id(execution_json["benchmark-id"], copy_index)
+                    postprocess.save_json(execution_json, path)
+            os.rename(copy_dir + ".tmp", copy_dir)
+    return log_dirs
+
+def run_stages(log_dirs, out_dir, trace_memory, jobs):
+    """ Runs the postprocessing stages (as in postprocess.py) and returns the wallclock time and, if trace_memory is set, the peak memory allocated by python (in MB) of each stage. """
+    postprocess.OUT_DIR = out_dir
+    measurements = OrderedDict()
+    data = dict()
+    def gather():
+        data["exec_data"], benchmark_instances = postprocess.gather_execution_data(log_dirs, silent=True, jobs=jobs)
+        data["benchmark_instances"] = OrderedDict(sorted(benchmark_instances.items(), key=lambda item: item[0]))
+    stage_functions = OrderedDict()
+    stage_functions["gather"] = gather
+    stage_functions["meta"] = lambda: postprocess.process_meta_configs(data["exec_data"], data["benchmark_instances"])
+    stage_functions["save"] = lambda: postprocess.save_execution_data(data["exec_data"], data["benchmark_instances"])
+    stage_functions["export"] = lambda: postprocess.export_all(data["exec_data"], data["benchmark_instances"])
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for stage, stage_function in stage_functions.items():
+            if trace_memory: tracemalloc.start()
+            start_time = time.perf_counter()
+            stage_function()
+            measurements[stage] = OrderedDict()
+            measurements[stage]["wallclock-time"] = time.perf_counter() - start_time
+            if trace_memory:
+                measurements[stage]["peak-memory"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                tracemalloc.stop()
+    return measurements
+
+def run_benchmark(archive, work_dir, scales, repetitions, jobs):
+    """
+    Runs the postprocessing stages on the archive and on synthetic multiples of it.
+    Times are the median over the repetitions. The peak memory is measured in an additional run, as tracing allocations slows down the stages.
+    """
+    results = OrderedDict()
+    for scale in scales:
+        register_instance_copies(scale)
+        log_dirs = create_log_dirs(archive, work_dir, scale)
+        out_dir = os.path.join(work_dir, f"data-x{scale}")
+        print(f"Scale x{scale} ({len(log_dirs)} log directories): ", end="", flush=True)
+        runs = []
+        for repetition in range(repetitions):
+            runs.append(run_stages(log_dirs, out_dir, False, jobs))
+            print(".", end="", flush=True)
+        memory_run = run_stages(log_dirs, out_dir, True, jobs) # only covers the allocations of this process, not those of the workers
+        print(" done.")
+        results[f"x{scale}"] = OrderedDict()
+        for stage in STAGES:
+            results[f"x{scale}"][stage] = OrderedDict()
+            results[f"x{scale}"][stage]["wallclock-time"] = statistics.median([run[stage]["wallclock-time"] for run in runs])
+            results[f"x{scale}"][stage]["wallclock-time-samples"] = [run[stage]["wallclock-time"] for run in runs]
+            results[f"x{scale}"][stage]["peak-memory"] = memory_run[stage]["peak-memory"]
+    return results
+
+def run_startup_benchmark(repetitions):
+    """
+    Measures the cold-start time of the scripts in fresh python processes. Times are the median over the repetitions.
+    The peak memory is the maximal resident set size of these processes.
+    """
+    results = OrderedDict()
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    print("Startup: ", end="", flush=True)
+    for name, args in STARTUP_COMMANDS.items():
+        samples = []
+        for repetition in range(repetitions):
+            start_time = time.perf_counter()
+            subprocess.run([sys.executable] + args, cwd=scripts_dir, stdout=subprocess.DEVNULL) # note: run.py exits with 1 after printing its usage
+            samples.append(time.perf_counter() - start_time)
+            print(".", end="", flush=True)
+        results[name] = OrderedDict()
+        results[name]["wallclock-time"] = statistics.median(samples)
+        results[name]["wallclock-time-samples"] = samples
+        results[name]["peak-memory"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(" done.")
+    return results
+
+def print_results(results, baseline = None):
+    print("\n{:<8} {:<8} {:>12} {:>14}".format("Scale", "Stage", "Time [s]", "Memory [MB]")) # the startup measurements are listed with scale 'startup' 
+    for scale, stages in results.items():
+        for stage, measurement in stages.items():
+            line = "{:<8} {:<8} {:>12.3f} {:>14.1f}".format(scale, stage, measurement["wallclock-time"], measurement["peak-memory"])
+            if baseline is not None and stage in baseline.get(scale, dict()):
+                base = baseline[scale][stage]
+                line += "   (baseline: {:.3f}s, {:.1f}MB)".format(base["wallclock-time"], base["peak-memory"])
+            print(line)
+
+def get_regressions(results, baseline, threshold):
+    """ Returns a description of each measurement that exceeds the corresponding baseline measurement by more than the given relative threshold. """
+    regressions = []
+    for scale, stages in results.items():
+        for stage, measurement in stages.items():
+            if stage not in baseline.get(scale, dict()): continue
+            for key in ["wallclock-time", "peak-memory"]:
+                if measurement[key] > baseline[scale][stage][key] * (1 + threshold):
+                    regressions.append(f"{scale} {stage} {key}: {measurement[key]:.3f} exceeds baseline {baseline[scale][stage][key]:.3f} by more than {threshold * 100:.0f}%")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks the stages of postprocess.py (gathering the execution data, processing the meta configurations, saving the execution data, and exporting the tables) on the archived logs, as well as the startup time of run.py.")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE, help=f"Archive of log directories (default: {DEFAULT_ARCHIVE}).")
+    parser.add_argument("--scales", default="1", help="Comma-separated multiples of the archive to benchmark, e.g. '1,2,4'. Multiples consist of copies of the execution results for synthetic copies of the benchmark instances (default: 1).")
+    parser.add_argument("--repetitions", type=int, default=3, help="Number of timed runs per scale and of startups (default: 3).")
+    parser.add_argument("--jobs", type=int, default=postprocess.JOBS, help=f"Number of worker processes for parsing the logfiles (default: {postprocess.JOBS}).")
+    parser.add_argument("--work-dir", help="Directory for the unpacked logs and the exported data. Unpacked logs are reused in later runs (default: a temporary directory that is removed afterwards).")
+    parser.add_argument("--output", help="Stores the measurements as json in the given file.")
+    parser.add_argument("--baseline", help="Compares the measurements with those in the given json file (as stored with --output).")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Maximal relative increase of time and memory over the baseline before the benchmark fails (default: 0.2).")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    archive = replace_placeholders_in_cmd_string(args.archive)
+    scales = [int(s) for s in args.scales.split(",")]
+    assert all([s >= 1 for s in scales]), "Scales must be positive."
+    assert args.repetitions >= 1, "At least one repetition is needed."
+    assert args.jobs >= 1, "At least one job is needed."
+    baseline = postprocess.load_json(args.baseline) if args.baseline is not None else None
+    work_dir = args.work_dir if args.work_dir is not None else tempfile.mkdtemp(prefix="postprocessbench-")
+    results = OrderedDict([["startup", run_startup_benchmark(args.repetitions)]])
+    try:
+        results.update(run_benchmark(archive, os.path.abspath(work_dir), scales, args.repetitions, args.jobs))
+    finally:
+        if args.work_dir is None: shutil.rmtree(work_dir)
+    print_results(results, baseline)
+    if args.output is not None:
+        postprocess.save_json(results, args.output)
+        print(f"Stored measurements in {args.output}.")
+    if baseline is not None:
+        regressions = get_regressions(results, baseline, args.threshold)
+        for r in regressions: print(f"REGRESSION: {r}")
+        if len(regressions) > 0: sys.exit(1)
+        print(f"No regressions compared to {args.baseline}.")
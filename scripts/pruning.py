@@ -0,0 +1,65 @@
+import os, json
+from collections import OrderedDict
+
+import tools
+from journal import get_result_file_path
+
+class FamilyPruning(object):
+    """
+    Prunes invocations of configuration families (configurations that only differ in an ordered parameter such as the size threshold).
+    The members of a family are executed on each instance in increasing order of their parameter.
+    Once a member yields a reason for pruning (e.g. a timeout), the members with a larger parameter are skipped and recorded as pruned.
+    """
+    def __init__(self, invocations, invocation_indices):
+        self.invocations = invocations
+        self.chains = dict() # invocation index -> (chain, parameter)
+        self.pruned_after = dict() # chain -> (parameter, reason, id of the invocation that yielded the reason)
+        for i in invocation_indices:
+            inv = invocations[i]
+            if "batch" in inv: continue # the results of a batch refer to several instances
+            family = tools.get_config_family(inv["tool"], inv["configuration-id"])
+            if family is not None:
+                self.chains[i] = ((inv["tool"], family[0], inv["benchmark-id"], inv["log-dir"]), family[1])
+
+    def get_chain(self, i):
+        return self.chains[i][0] if i in self.chains else None
+
+    def order(self, invocation_indices):
+        """ Reorders the given indices such that each chain is in increasing order of the parameter. The positions occupied by a chain remain the same. """
+        result = list(invocation_indices)
+        positions = OrderedDict() # chain -> positions in the result
+        for pos, i in enumerate(result):
+            if i in self.chains: positions.setdefault(self.chains[i][0], []).append(pos)
+        for chain_positions in positions.values():
+            members = sorted([result[pos] for pos in chain_positions], key=lambda i: self.chains[i][1])
+            for pos, i in zip(chain_positions, members):
+                result[pos] = i
+        return result
+
+    def record(self, i, result_json):
+        """ Records the result of the given invocation and returns the reason for pruning larger members of its family, if any. """
+        if i not in self.chains or "pruned" in result_json: return None
+        inv = self.invocations[i]
+        reason = tools.get_pruning_reason(result_json, os.path.join(inv["log-dir"], inv["log"]))
+        if reason is None: return None
+        chain, parameter = self.chains[i]
+        if chain not in self.pruned_after or parameter < self.pruned_after[chain][0]:
+            self.pruned_after[chain] = (parameter, reason, inv["id"])
+        return reason
+
+    def record_existing_results(self, invocation_indices):
+        """ Records the results of previous executions of the given invocations, e.g. when resuming a campaign. """
+        for i in invocation_indices:
+            if i in self.chains and os.path.isfile(get_result_file_path(self.invocations[i])):
+                with open(get_result_file_path(self.invocations[i]), 'r', encoding='utf-8-sig') as json_file:
+                    self.record(i, json.load(json_file, object_pairs_hook=OrderedDict))
+
+    def get_pruned_result(self, i):
+        """ Returns the result json if the given invocation is pruned, or None if it has to be executed. """
+        if i not in self.chains: return None
+        chain, parameter = self.chains[i]
+        if chain not in self.pruned_after or parameter <= self.pruned_after[chain][0]: return None
+        result = OrderedDict(self.invocations[i])
+        result["pruned"] = self.pruned_after[chain][1]
+        result["pruned-by"] = self.pruned_after[chain][2]
+        return result
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the storm-pomdp binary that replays archived executions instead of running storm.
+This allows to benchmark the harness itself (runner overhead, scheduling, log parsing) without a storm installation.
+The command line arguments are matched against the commands of the execution results in the archive (by default experiments/logs.tar.gz).
+Paths are compared by their file name only, so the archive matches regardless of the location of the benchmark directory.
+On a match, the archived output is printed after the archived wallclock time has passed and the archived return code is returned.
+Executions that timed out are replayed by printing their output and waiting until the harness kills the process.
+The command lines of batched invocations (see batch_invocations in commands.py) and of invocations that load their model from the model cache (see modelcache.py)
+differ from those of the archived executions, so they never match. Hence, invocations that are replayed have to be created without batching and without a model cache.
+
+Usage: link or copy this file to bin/storm-pomdp (the default executable of storm.py) or enter its path when creating invocations.
+A copy finds the other scripts (e.g. executing.py) in the scripts directory next to the directory it is located in.
+The replay is configured with the following environment variables:
+    STORM_REPLAY_ARCHIVE       the archive of execution results (default: experiments/logs.tar.gz)
+    STORM_REPLAY_DIR           directory in which the archive is unpacked on first use (default: a directory in the system's temp directory)
+    STORM_REPLAY_TIME_SCALE    factor applied to the archived wallclock times (default: 1.0)
+    STORM_REPLAY_MEMORY_SCALE  factor applied to the archived peak memory usage, which is then allocated while replaying (default: 0.0, i.e., no memory is allocated)
+"""
+import time
+START_TIME = time.time() # the time for loading the index is part of the replayed wallclock time
+import os, sys, json, tarfile, fcntl, hashlib, tempfile, signal, re, resource
+from collections import OrderedDict
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "scripts")) # for a copy in bin/. The directory of the script stays first, as $BENCH_HOME is its parent
+from executing import replace_placeholders_in_cmd_string, STDERR_HEADING
+
+DEFAULT_ARCHIVE = "$BENCH_HOME/experiments/logs.tar.gz"
+INDEX_FILENAME = "index.json"
+TRAILER_START = "\n" + "-"*10 + "\nComputation aborted after " # see executing.Execution
+
+def get_replay_key(args):
+    """ Returns the key of the given command line arguments (excluding the binary). Paths are reduced to their file names. """
+    return " ".join([os.path.basename(a) if "/" in a else a for a in args])
+
+def get_replay_dir(archive):
+    stat = os.stat(archive)
+    archive_id = hashlib.sha1(f"{os.path.realpath(archive)}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"storm-replay-{archive_id}")
+
+def unpack_archive(archive, replay_dir):
+    """ Unpacks the logs of the given archive into the replay directory and creates an index that maps replay keys to the archived executions. """
+    index = OrderedDict()
+    logs = set()
+    with tarfile.open(archive, 'r:gz') as tar:
+        for member in tar:
+            if not member.isfile(): continue
+            filename = member.name.replace("/", "_") # flat, so member names can not escape the replay directory
+            if member.name.endswith(".log"):
+                with open(os.path.join(replay_dir, filename), 'wb') as logfile:
+                    logfile.write(tar.extractfile(member).read())
+                logs.add(filename)
+            elif member.name.endswith(".json"):
+                result_json = json.load(tar.extractfile(member))
+                if not isinstance(result_json, dict) or len(result_json.get("commands", [])) != 1 or "wallclock-time" not in result_json: continue # only single commands can be replayed
+                key = get_replay_key(result_json["commands"][0].split()[1:])
+                if key in index: continue # identical command lines yield the same output
+                entry = OrderedDict()
+                entry["log"] = os.path.join(os.path.dirname(member.name), result_json["log"]).replace("/", "_")
+                entry["wallclock-time"] = result_json["wallclock-time"]
+                entry["timeout"] = result_json["timeout"]
+                entry["return-code"] = result_json["return-codes"][0] if len(result_json["return-codes"]) > 0 else 0
+                index[key] = entry
+    index = OrderedDict([[k, e] for k, e in index.items() if e["log"] in logs])
+    with open(os.path.join(replay_dir, INDEX_FILENAME + ".tmp"), 'w') as index_file:
+        json.dump(index, index_file, ensure_ascii=False)
+    os.replace(os.path.join(replay_dir, INDEX_FILENAME + ".tmp"), os.path.join(replay_dir, INDEX_FILENAME))
+
+def load_index(archive, replay_dir):
+    """ Returns the index of the replay directory. The archive is unpacked first if this did not happen yet. Concurrent replays wait for each other via a lock file. """
+    index_path = os.path.join(replay_dir, INDEX_FILENAME)
+    if not os.path.isfile(index_path):
+        os.makedirs(replay_dir, exist_ok=True)
+        with open(replay_dir + ".lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.isfile(index_path): unpack_archive(archive, replay_dir)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    with open(index_path, 'r', encoding='utf-8') as index_file:
+        return json.load(index_file)
+
+def get_archived_output(log):
+    """ Returns the output to stdout and stderr of the (single) command of the given archived log. """
+    output = log[log.index("Output:\n") + len("Output:\n"):]
+    if TRAILER_START in output: output = output[:output.rindex(TRAILER_START)]
+    if output.endswith("\n"): output = output[:-1] # appended when the log is written
+    if STDERR_HEADING in output:
+        stdout, stderr = output.split(STDERR_HEADING, 1)
+        return stdout, stderr
+    return output, ""
+
+def get_archived_peak_memory(stdout):
+    """ Returns the peak memory usage (in MB) reported in the given output, or 0 if there is none. """
+    match = re.search(r"peak memory usage: (\d+)MB", stdout)
+    return int(match.group(1)) if match is not None else 0
+
+def allocate_memory(size_mb):
+    """ Allocates and touches the given amount of memory, so it counts towards the resident set size of the process. """
+    memory = bytearray(int(size_mb * 1024 * 1024))
+    for i in range(0, len(memory), resource.getpagesize()):
+        memory[i] = 1
+    return memory
+
+def write_output(text, stream):
+    stream.write(text)
+    stream.flush()
+
+def replay(entry, replay_dir, time_scale, memory_scale):
+    with open(os.path.join(replay_dir, entry["log"]), 'r', encoding='utf-8', errors='replace') as logfile:
+        stdout, stderr = get_archived_output(logfile.read())
+    memory = allocate_memory(get_archived_peak_memory(stdout) * memory_scale) if memory_scale > 0 else None
+    if entry["timeout"]:
+        def on_terminate(signum, frame):
+            write_output(stderr, sys.stderr) # storm's message about the received signal
+            os._exit(128 + signum)
+        signal.signal(signal.SIGTERM, on_terminate)
+        write_output(stdout, sys.stdout)
+        while True: time.sleep(3600) # until the harness kills us
+    time.sleep(max(0.0, entry["wallclock-time"] * time_scale - (time.time() - START_TIME)))
+    write_output(stdout, sys.stdout)
+    write_output(stderr, sys.stderr)
+    del memory
+    if entry["return-code"] < 0: # killed by a signal, e.g. SIGABRT
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        signal.signal(-entry["return-code"], signal.SIG_DFL)
+        os.kill(os.getpid(), -entry["return-code"])
+    return entry["return-code"]
+
+def main(args):
+    archive = replace_placeholders_in_cmd_string(os.environ.get("STORM_REPLAY_ARCHIVE", DEFAULT_ARCHIVE))
+    if "--prism" not in args and "--explicit-drn" not in args: # e.g. when testing the executable
+        print(f"Storm-POMDP replay of {archive}")
+        return 0
+    replay_dir = os.environ.get("STORM_REPLAY_DIR", get_replay_dir(archive))
+    index = load_index(archive, replay_dir)
+    key = get_replay_key(args)
+    if key not in index:
+        sys.stderr.write(f"ERROR: No archived execution in {archive} matches the command line arguments '{key}'. Batched invocations and invocations with a model cache can not be replayed.\n")
+        return 1
+    return replay(index[key], replay_dir, float(os.environ.get("STORM_REPLAY_TIME_SCALE", "1.0")), float(os.environ.get("STORM_REPLAY_MEMORY_SCALE", "0.0")))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
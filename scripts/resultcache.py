@@ -0,0 +1,79 @@
+import os, json, hashlib, shutil, copy, threading
+from collections import OrderedDict
+
+from executing import replace_placeholders_in_cmd_string
+
+CACHE_KEY_VERSION = 1 # increase to invalidate all existing cache entries
+CACHED_INVOCATION_KEYS = ["time-limit", "memory-limit", "repetitions", "warmup-runs"] # invocation fields that influence the result
+FILE_HASHES = dict() # (path, size, modification time) -> hash
+
+def get_file_hash(path):
+    """ Returns the sha256 hash of the content of the given file. Hashes are memorized as long as the size and modification time of the file remain the same. """
+    stat = os.stat(path)
+    memo_key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in FILE_HASHES:
+        file_hash = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                file_hash.update(chunk)
+        FILE_HASHES[memo_key] = file_hash.hexdigest()
+    return FILE_HASHES[memo_key]
+
+def is_cacheable(result_json):
+    """ Errors and killed executions (memouts and timeouts, see Execution.run_once) may not be reproducible, so they are executed again instead of being taken from the cache. """
+    if result_json.get("execution-error", False) or result_json.get("memout", False): return False
+    return -9 not in result_json.get("return-codes", [])
+
+
+class ResultCache(object):
+    """
+    Content-addressed cache of execution results, stored as pairs of a logfile and a result json within a cache directory.
+    The key of an invocation is a hash of its resolved command lines, the content of all files referenced in the command lines (including the binary, model and property files), and the limits of the invocation.
+    Hence, an entry is no longer found as soon as any of these inputs changes.
+    Shared libraries used by the binary are not taken into account.
+    Only results that are reproducible (see is_cacheable) are stored, so that e.g. errors are executed again when they are retried.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_key(self, invocation):
+        key = hashlib.sha256()
+        key.update(f"{CACHE_KEY_VERSION}\n".encode('utf-8'))
+        for field in CACHED_INVOCATION_KEYS:
+            key.update(f"{field}={invocation.get(field)}\n".encode('utf-8'))
+        for command in invocation["commands"]:
+            tokens = [replace_placeholders_in_cmd_string(c) for c in command.split()] # the same way as when executing the command
+            key.update(" ".join(tokens).encode('utf-8') + b"\n")
+            binary = tokens[0] if os.path.isfile(tokens[0]) else shutil.which(tokens[0])
+            for path in ([binary] if binary is not None else []) + [t for t in tokens[1:] if os.path.isfile(t)]:
+                key.update(f"{path}:{get_file_hash(path)}\n".encode('utf-8'))
+        return key.hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def lookup(self, invocation):
+        """ Returns the result json and the path to the logfile of a cached execution of the given invocation, or (None, None) if there is none. """
+        entry_path = self.get_entry_path(self.get_key(invocation))
+        if not os.path.isfile(entry_path + ".json") or not os.path.isfile(entry_path + ".log"): return None, None
+        with open(entry_path + ".json", 'r', encoding='utf-8-sig') as json_file:
+            cached_json = json.load(json_file, object_pairs_hook=OrderedDict)
+        if not is_cacheable(cached_json): return None, None # stored by an earlier version
+        result_json = copy.deepcopy(invocation)
+        for k, v in cached_json.items():
+            if k not in result_json: result_json[k] = v # the measurements of the cached execution
+        result_json["cached-result-of"] = cached_json["id"]
+        return result_json, entry_path + ".log"
+
+    def store(self, result_json, log_path):
+        """ Stores the given result and a copy of its logfile in the cache, unless it is not cacheable. Files are moved into place atomically, so concurrent workers never see partial entries. """
+        if not is_cacheable(result_json): return
+        entry_path = self.get_entry_path(self.get_key(result_json))
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        tmp_suffix = f".tmp{os.getpid()}.{threading.get_ident()}"
+        shutil.copyfile(log_path, entry_path + ".log" + tmp_suffix)
+        os.replace(entry_path + ".log" + tmp_suffix, entry_path + ".log")
+        with open(entry_path + ".json" + tmp_suffix, 'w') as json_file:
+            json.dump(OrderedDict([[k, v] for k, v in result_json.items() if k != "aliases"]), json_file, ensure_ascii=False, indent='\t')
+        os.replace(entry_path + ".json" + tmp_suffix, entry_path + ".json")
@@ -1,59 +1,354 @@
-import json, traceback, sys, os
+import json, traceback, sys, os, argparse, time, shutil
 from collections import OrderedDict
 from time import sleep
 
-from executing import Execution
-from commands import create_invocations
+from executing import Execution, InvocationScheduler, parse_memory_size, ABORT_REQUESTED
+from journal import JournalSet, get_result_file_path, STATUSES
+# the modules for the options (e.g. pruning.py for --prune) are only imported if the option is given, which keeps the startup of runs fast
+
+JOURNALS = JournalSet()
+INTERRUPTED = set() # indices of invocations that the user aborted (CTRL+C during a sequential run), which are not executed again by this worker
+
+def prepare_invocation(invocation):
+    """ Builds the cached model of the given invocation (see modelcache.py) and returns the invocation to execute. """
+    if "model-cache" not in invocation: return invocation
+    import modelcache
+    return modelcache.prepare_invocation(invocation)
+
+
+def store_aliases(index, result_json):
+    """ Copies the result of an invocation with identical command lines to its aliases (see deduplicate_invocations in commands.py). """
+    log_path = os.path.join(result_json["log-dir"], result_json["log"])
+    for alias in result_json.get("aliases", []):
+        alias_json = OrderedDict([[k, v] for k, v in result_json.items() if k != "aliases"])
+        alias_json.update(alias)
+        alias_json["alias-of"] = result_json["id"]
+        shutil.copyfile(log_path, os.path.join(alias_json["log-dir"], alias_json["log"]))
+        with open(get_result_file_path(alias_json), 'w') as json_file:
+            json.dump(alias_json, json_file, ensure_ascii=False, indent='\t')
+        JOURNALS.get(alias_json).record_finished(index, alias_json, alias_json)
+
+def get_batch_member_invocation(result_json, member_id):
+    """ Returns the invocation that executes the given invocation of a batch on its own. """
+    member = [m for m in result_json["batch"] if m["id"] == member_id][0]
+    assert "commands" in member, f"Invocation {member_id} was not analyzed by its batch {result_json['id']} and can not be executed on its own. Please create the invocations file again."
+    invocation = OrderedDict(member)
+    for key in ["tool", "log-dir", "memory-limit", "repetitions", "warmup-runs"]:
+        if key in result_json: invocation[key] = result_json[key]
+    return invocation
+
+def store_batch_members(index, result_json):
+    """
+    Splits the log of a batch (see batch_invocations in commands.py) and stores logs and results for each invocation of the batch.
+    Invocations whose property the batch did not analyze (see split_batch_log in storm.py) are executed on their own, so that their results do not depend on the other properties of the batch.
+    Returns False if one of these executions was aborted.
+    """
+    if "batch" not in result_json: return True
+    import tools
+    with open(os.path.join(result_json["log-dir"], result_json["log"]), 'r', encoding='utf-8', errors='replace') as logfile:
+        log = logfile.read()
+    for member_json, member_log in tools.split_batch_log(result_json, log):
+        if member_log is None:
+            print_line(f"Executing invocation {member_json['id']} of batch #{index} on its own...")
+            if run_and_store(index, Execution(prepare_invocation(get_batch_member_invocation(result_json, member_json["id"])))).aborted: return False
+            continue
+        with open(os.path.join(member_json["log-dir"], member_json["log"]), 'w', encoding='utf-8') as logfile:
+            logfile.write(member_log)
+        with open(get_result_file_path(member_json), 'w') as json_file:
+            json.dump(member_json, json_file, ensure_ascii=False, indent='\t')
+        JOURNALS.get(member_json).record_finished(index, member_json, member_json)
+        store_aliases(index, member_json)
+    return True
+
+def run_and_store(index, execution):
+    """
+    Runs the given execution and stores the result next to its logfile. Results of aborted executions are not stored.
+    Start and end of the execution are recorded in the journal of the log directory.
+    A batch only counts as finished once all of its invocations are stored. Otherwise, its execution is marked as aborted.
+    """
+    invocation = execution.invocation
+    journal = JOURNALS.get(invocation)
+    journal.record_started(index, invocation)
+    execution_result = execution.run()
+    if not execution.aborted:
+        with open(get_result_file_path(invocation), 'w') as json_file:
+            json.dump(execution_result, json_file, ensure_ascii=False, indent='\t')
+        if not store_batch_members(index, execution_result):
+            execution.aborted = True
+            return execution
+        journal.record_finished(index, invocation, execution_result)
+        store_aliases(index, execution_result)
+    return execution
+
+def store_pruned(index, result_json):
+    """ Stores the result of a pruned invocation (which is not executed) together with a short logfile. """
+    invocation = result_json
+    with open(os.path.join(invocation["log-dir"], invocation["log"]), 'w') as logfile:
+        logfile.write(f"Invocation pruned: invocation {result_json['pruned-by']} of the same configuration family yielded '{result_json['pruned']}' with a smaller parameter.\n")
+    with open(get_result_file_path(invocation), 'w') as json_file:
+        json.dump(result_json, json_file, ensure_ascii=False, indent='\t')
+    JOURNALS.get(invocation).record_finished(index, invocation, result_json)
+    store_aliases(index, result_json)
+
+def store_cached(index, result_json, cached_log_path):
+    """ Stores the result of an invocation that was found in the result cache, together with a copy of the cached logfile. """
+    invocation = result_json
+    shutil.copyfile(cached_log_path, os.path.join(invocation["log-dir"], invocation["log"]))
+    with open(get_result_file_path(invocation), 'w') as json_file:
+        json.dump(result_json, json_file, ensure_ascii=False, indent='\t')
+    if not store_batch_members(index, result_json): return
+    JOURNALS.get(invocation).record_finished(index, invocation, result_json)
+    store_aliases(index, result_json)
+
+def run_sequential(invocations, invocation_indices, pruning = None, history = None, queue = None, cache = None):
+    executions = []
+    for i in invocation_indices:
+        invocation = invocations[i]
+        if queue is not None and not queue.claim(i): continue
+        if cache is not None:
+            cached_result, cached_log_path = cache.lookup(invocation)
+            if cached_result is not None:
+                store_cached(i, cached_result, cached_log_path)
+                if queue is not None: queue.finish(i)
+                if pruning is not None: pruning.record(i, cached_result)
+                print(f"Cached invocation #{i}: {invocation['id']}.")
+                continue
+        if pruning is not None and pruning.get_pruned_result(i) is not None:
+            store_pruned(i, pruning.get_pruned_result(i))
+            if queue is not None: queue.finish(i)
+            print(f"Pruned invocation #{i}: {invocation['id']}.")
+            continue
+        sys.stdout.write(f"Executing invocation #{i}: {invocation['id']}... ")
+        sys.stdout.flush()
+        interrupted, failed, execution = False, False, None
+        try:
+            execution = Execution(prepare_invocation(invocation))
+            run_and_store(i, execution)
+            interrupted = execution.aborted # the result of an aborted execution is neither stored nor recorded
+            if not execution.aborted:
+                executions.append(execution)
+                if pruning is not None: pruning.record(i, execution.to_json())
+                if history is not None: history.record(execution.to_json())
+                if cache is not None: cache.store(execution.to_json(), os.path.join(invocation["log-dir"], invocation["log"]))
+        except KeyboardInterrupt as e:
+            interrupted = True
+            print("\nInterrupt while processing invocation #{}: {}\n".format(i, invocation['id']))
+            print("Continuing in 5 seconds")
+            sleep(5)
+        except Exception:
+            failed = True
+            print("\nERROR while processing invocation #{}: {}".format(i, invocation['id']))
+            traceback.print_exc()
+        finally:
+            if interrupted: INTERRUPTED.add(i)
+            if queue is not None: # interrupted invocations are left to other workers
+                if interrupted: queue.release(i)
+                else: queue.finish(i)
+        wall_time = "" if execution is None or execution.wall_time is None else f" ({execution.wall_time:.2f}s)" # e.g. if the cached model could not be prepared
+        print(f"{'aborted' if interrupted else 'failed' if failed else 'done'}{wall_time}.")
+    return executions
+
+def print_line(line):
+    sys.stdout.write(line + "\n") # a single write avoids interleaving with lines printed by other threads
+    sys.stdout.flush()
+
+def run_parallel(invocations, invocation_indices, num_jobs, memory_budget = None, memory_history = [], pruning = None, history = None, queue = None, cache = None):
+    executions = []
+    def run_job(i):
+        print_line(f"Executing invocation #{i}: {invocations[i]['id']}...")
+        return run_and_store(i, Execution(prepare_invocation(invocations[i])))
+    def on_done(i, execution, exception):
+        if queue is not None: # aborted invocations are left to other workers
+            if exception is None and execution.aborted: queue.release(i)
+            else: queue.finish(i)
+        if exception is not None:
+            print("ERROR while processing invocation #{}: {}".format(i, invocations[i]['id']))
+            traceback.print_exception(type(exception), exception, exception.__traceback__)
+        elif execution.aborted:
+            print_line(f"Aborted invocation #{i}: {invocations[i]['id']} ({execution.wall_time:.2f}s).")
+        else:
+            executions.append(execution)
+            print_line(f"Finished invocation #{i}: {invocations[i]['id']} ({execution.wall_time:.2f}s).")
+            if pruning is not None: pruning.record(i, execution.to_json())
+            if history is not None: history.record(execution.to_json())
+            if cache is not None: cache.store(execution.to_json(), os.path.join(invocations[i]["log-dir"], invocations[i]["log"]))
+    def skip_job(i):
+        if queue is not None and not queue.claim(i): return True # finished or claimed by another worker
+        if cache is not None:
+            cached_result, cached_log_path = cache.lookup(invocations[i])
+            if cached_result is not None:
+                store_cached(i, cached_result, cached_log_path)
+                if queue is not None: queue.finish(i)
+                if pruning is not None: pruning.record(i, cached_result)
+                print_line(f"Cached invocation #{i}: {invocations[i]['id']}.")
+                return True
+        if pruning is None or pruning.get_pruned_result(i) is None: return False
+        store_pruned(i, pruning.get_pruned_result(i))
+        if queue is not None: queue.finish(i)
+        print_line(f"Pruned invocation #{i}: {invocations[i]['id']}.")
+        return True
+    def estimate_memory(i):
+        import tools
+        estimate = tools.estimate_peak_memory(invocations[i], memory_history)
+        if "memory-limit" in invocations[i]: # the invocation can not exceed its limit
+            estimate = invocations[i]["memory-limit"] if estimate is None else min(estimate, invocations[i]["memory-limit"])
+        return estimate
+    try:
+        get_chain = None if pruning is None else pruning.get_chain
+        InvocationScheduler(num_jobs, memory_budget, estimate_memory, get_chain, skip_job).run(invocation_indices, run_job, on_done)
+    except KeyboardInterrupt:
+        print("Aborted. Results of aborted invocations have not been stored.")
+    return executions
+
+def format_duration(seconds):
+    return "{}h{:02d}m{:02d}s".format(int(seconds) // 3600, int(seconds) % 3600 // 60, int(seconds) % 60)
+
+def print_prediction(invocation_indices, estimates, num_unknown, num_jobs):
+    from history import predict_campaign_time
+    total_time = sum([estimates[i] for i in invocation_indices])
+    print(f"Predicted campaign time: {format_duration(predict_campaign_time(invocation_indices, estimates, num_jobs))} with {num_jobs} job(s) ({format_duration(total_time)} accumulated invocation time).")
+    if num_unknown > 0:
+        print(f"\t{num_unknown} of {len(invocation_indices)} invocations have no recorded runtime and are estimated by the average runtime of their configuration (or their time limit).")
+
+def print_throughput(executions, elapsed_time):
+    total_time = sum([e.wall_time for e in executions])
+    print(f"Executed {len(executions)} invocations in {elapsed_time:.2f}s ({total_time:.2f}s accumulated invocation time).")
+    if elapsed_time > 0:
+        print(f"Throughput: {len(executions) * 3600 / elapsed_time:.1f} invocations per hour, speedup {total_time / elapsed_time:.2f}.")
+
 
-    
 if __name__ == "__main__":
     print("Storm benchmarking tool.")
     print("This script selects and executes benchmarks.")
     print("Usages:")
     print("python3 {}                 Creates an invocations file.".format(sys.argv[0]))
-    print("python3 {} <filename>      Executes benchmarks from a previously created invocations file located at <filename>.".format(sys.argv[0]))
+    print("python3 {} <filename>      Executes benchmarks from a previously created invocations file located at <filename> (a json array or a jsonl file with one invocation per line).".format(sys.argv[0]))
     print("python3 {} <filename> <i>  Executes the <i>th invocation (0 based) from a previously created invocations file located at <filename>.".format(sys.argv[0]))
+    print("python3 {} --campaign <file>  Non-interactively creates the invocations file described by the campaign file <file> (see create_invocations_from_campaign in commands.py).".format(sys.argv[0]))
+    print("Options:")
+    print("--jobs <n>                 Executes up to <n> invocations concurrently (default: 1).")
+    print("--mem-budget <size>        Only runs invocations concurrently as long as their estimated peak memory fits into <size> (e.g. 64G).")
+    print("--mem-history <dir>        Estimates peak memory from previous runs with logfiles in <dir>. Can be given multiple times.")
+    print("--mem-limit <size>         Limits the memory of invocations to <size>, i.e., the address space of each process (except on macOS) and the resident memory of all processes together. Exceeding invocations are recorded as memout.")
+    print("--repetitions <n>          Executes each invocation <n> times and reports the median wallclock time together with further statistics.")
+    print("--warmup <n>               Executes each invocation <n> additional times before the measured repetitions.")
+    print("--resume                   Skips invocations that already finished according to the journal (or result file) in the log directory.")
+    print("--retry <status>           With --resume, re-runs finished invocations with the given status ({}). Can be given multiple times.".format(", ".join(STATUSES[1:])))
+    print("--shard <k>/<n>            Only executes every <n>-th invocation, starting with the <k>-th one (0 based), e.g. for cluster array jobs.")
+    print("--queue <dir>              Claims invocations through files in the (shared) directory <dir>, so that several workers can execute the same invocations file.")
+    print("--lease <seconds>          With --queue, claims of workers that did not renew them for <seconds> are re-leased to other workers (default: 600).")
+    print("--cache <dir>              Reuses results from the cache in <dir> for invocations with identical command lines, input files and limits, and adds new results to it. Errors, timeouts and memouts are not cached.")
+    print("--history <file>           Maintains a database of the runtimes of previous executions in <file>, which is used to predict the campaign time.")
+    print("--history-import <dir>     Adds the runtimes of the results in <dir> to the runtime history. Can be given multiple times.")
+    print("--order <order>            Executes invocations in the given order (given, sjf: shortest first, ljf: longest first) based on their expected runtime (default: given).")
+    print("--rebuild-failed           Builds cached models again whose build failed in an earlier run (see modelcache.py).")
+    print("--prune                    Runs configuration families (e.g. increasing size thresholds) in increasing order and skips larger members once a smaller one timed out, ran out of memory, or explored the belief MDP completely.")
     print("")
-    if (len(sys.argv) == 2 and sys.argv[1] in ["-h", "-help", "--help"]) or len(sys.argv) > 3:
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("filename", nargs="?")
+    parser.add_argument("index", nargs="?")
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--mem-budget", type=parse_memory_size)
+    parser.add_argument("--mem-history", action="append", default=[])
+    parser.add_argument("--mem-limit", type=parse_memory_size)
+    parser.add_argument("--repetitions", type=int)
+    parser.add_argument("--warmup", type=int)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--retry", action="append", default=[], choices=STATUSES[1:])
+    parser.add_argument("--prune", action="store_true")
+    parser.add_argument("--rebuild-failed", action="store_true")
+    parser.add_argument("--shard")
+    parser.add_argument("--queue")
+    parser.add_argument("--lease", type=float)
+    parser.add_argument("--cache")
+    parser.add_argument("--history")
+    parser.add_argument("--history-import", action="append", default=[])
+    parser.add_argument("--order", default="given")
+    parser.add_argument("--campaign")
+    if len(sys.argv) == 2 and sys.argv[1] in ["-h", "-help", "--help"]:
         exit(1)
-        
-    if len(sys.argv) == 1:
+    args, unknown_args = parser.parse_known_args()
+    if len(unknown_args) > 0 or args.jobs < 1:
+        exit(1)
+
+    # commands (and with it the benchmark instances and configurations) is only imported for creating invocations, which keeps the startup of runs fast
+    if args.campaign is not None:
+        from commands import create_invocations_from_campaign
+        create_invocations_from_campaign(args.campaign)
+    elif args.filename is None:
         input("No invocations file loaded. Press Return to create one now or CTRL+C to abort.")
+        from commands import create_invocations
         create_invocations()
     else:
-        assert os.path.isfile(sys.argv[1]), f"Invocations file {sys.argv[1]} does not exist."
-        with open(sys.argv[1], 'r', encoding='utf-8-sig') as json_file:
-            invocations = json.load(json_file, object_pairs_hook=OrderedDict)
+        assert os.path.isfile(args.filename), f"Invocations file {args.filename} does not exist."
+        from invocations import load_invocations
+        invocations = load_invocations(args.filename)
         print(f"Loaded {len(invocations)} invocations.")
-        if len(sys.argv) == 3:
-            assert sys.argv[2].isdigit(), f"Expected a non-negative number for second argument but got '{sys.argv[2]}' instead."
-            selected_index = int(sys.argv[2])
+        if args.index is not None:
+            assert args.index.isdigit(), f"Expected a non-negative number for second argument but got '{args.index}' instead."
+            selected_index = int(args.index)
             assert selected_index < len(invocations), f"Second argument is out of range: got {selected_index} but there are {len(invocations)} invocations."
             invocation_indices = [selected_index]
         else:
             invocation_indices = range(len(invocations))
-        for i in invocation_indices:
-            invocation = invocations[i]
-            sys.stdout.write(f"Executing invocation #{i}: {invocation['id']}... ")
-            sys.stdout.flush()
-            try:
-                execution = Execution(invocation)
-                execution_result = execution.run()
-                json_file_path = os.path.join(invocation["log-dir"], os.path.splitext(invocation["log"])[0] + ".json")
-                with open(json_file_path, 'w') as json_file:
-                    json.dump(execution_result, json_file, ensure_ascii=False, indent='\t')
-            except KeyboardInterrupt as e:
-                print("\nInterrupt while processing invocation #{}: {}\n".format(i, invocation['id']))
-                print("Continuing in 5 seconds")
-                sleep(5)
-            except Exception:
-                print("\nERROR while processing invocation #{}: {}".format(i, invocation['id']))
-                traceback.print_exc()
-            print(f"done ({execution.wall_time:.2f}s).")
-
-    
-    
-    
-
-    
-    
\ No newline at end of file
+        if args.shard is not None:
+            from workqueue import parse_shard, get_shard
+            invocation_indices = get_shard(invocation_indices, parse_shard(args.shard))
+        if args.mem_limit is not None:
+            for i in invocation_indices: invocations[i]["memory-limit"] = args.mem_limit
+        if args.repetitions is not None:
+            assert args.repetitions >= 1, f"Invalid number of repetitions: {args.repetitions}"
+            for i in invocation_indices: invocations[i]["repetitions"] = args.repetitions
+        if args.warmup is not None:
+            assert args.warmup >= 0, f"Invalid number of warm-up runs: {args.warmup}"
+            for i in invocation_indices: invocations[i]["warmup-runs"] = args.warmup
+        if args.rebuild_failed:
+            import modelcache
+            modelcache.RETRY_FAILED_BUILDS = True
+        pruning = None
+        if args.prune:
+            from pruning import FamilyPruning
+            pruning = FamilyPruning(invocations, invocation_indices)
+        if args.resume:
+            selected_indices = invocation_indices
+            invocation_indices = JOURNALS.get_invocations_to_run(invocations, invocation_indices, args.retry)
+            if pruning is not None: pruning.record_existing_results(sorted(set(selected_indices) - set(invocation_indices)))
+        history = None
+        if args.history is not None or len(args.history_import) > 0 or args.order != "given":
+            from history import RuntimeHistory, order_invocations
+            history = RuntimeHistory(args.history)
+            for log_dir in args.history_import:
+                print(f"Imported {history.import_log_dir(log_dir)} runtimes from {log_dir}.")
+            estimates, num_unknown = history.estimate_runtimes(invocations, invocation_indices)
+            invocation_indices = order_invocations(invocation_indices, estimates, args.order)
+        if pruning is not None:
+            invocation_indices = pruning.order(invocation_indices)
+        if args.history is not None or len(args.history_import) > 0:
+            print_prediction(invocation_indices, estimates, num_unknown, args.jobs)
+        queue = None
+        if args.queue is not None:
+            from workqueue import WorkQueue
+            queue = WorkQueue(args.queue) if args.lease is None else WorkQueue(args.queue, args.lease)
+        cache = None
+        if args.cache is not None:
+            from resultcache import ResultCache
+            cache = ResultCache(args.cache)
+        def run_invocations(indices):
+            if args.jobs == 1:
+                return run_sequential(invocations, indices, pruning, history, queue, cache)
+            else:
+                return run_parallel(invocations, indices, args.jobs, args.mem_budget, args.mem_history, pruning, history, queue, cache)
+        start_time = time.time()
+        try:
+            executions = run_invocations(invocation_indices)
+            while queue is not None and not ABORT_REQUESTED.is_set():
+                # wait for invocations claimed by other workers, so that their claims can be re-leased if the workers crash
+                unfinished = [i for i in queue.get_unfinished(invocation_indices) if i not in INTERRUPTED]
+                if len(unfinished) == 0: break
+                print(f"Waiting for {len(unfinished)} invocation(s) claimed by other workers...")
+                sleep(min(60, queue.lease_time / 4))
+                executions += run_invocations(unfinished)
+        finally:
+            if history is not None: history.save()
+        if len(invocation_indices) > 1:
+            print_throughput(executions, time.time() - start_time)
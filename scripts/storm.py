@@ -1,7 +1,9 @@
-import os, copy, itertools, json
+import os, itertools, json, re, math, hashlib, mmap, dataclasses
 from collections import OrderedDict
+from typing import Optional
 
 import benchmarks
+import executing
 
 def const_def_string(inst):
     if "open-parameters" in inst["model"]:
@@ -15,21 +17,158 @@ def lvl_width_string(inst):
         values = [f"{pars[p]}" for p in pars if p.startswith("__lvl")]
         if len(values) != 0: return ",".join(values)
 
-def get_command_line_args(cfg, inst = None):
+def get_command_line_args(cfg, inst = None, model_cache_dir = None):
+    """ If a model cache directory is given, the model is loaded from the cache (see get_model_build_command_line_args) if possible. """
     out = []
     lvl_def = None
     if inst is not None:
         assert inst["model"]["formalism"] == "prism", f"Unhandled model formalism {inst['model']['formalism']} for storm."
-        out.append(f"--prism {benchmarks.get_full_model_filename(inst)}")
+        if model_cache_dir is not None and can_use_cached_model(inst):
+            out.append(f"--explicit-drn {get_cached_model_filename(inst, model_cache_dir)}")
+            c = ",".join([f"{p}={inst['model']['open-parameters'][p]}" for p in get_property_constants(inst)]) # the model constants are already applied
+        else:
+            out.append(f"--prism {benchmarks.get_full_model_filename(inst)}")
+            c = const_def_string(inst)
         out.append(f"--prop {benchmarks.get_full_property_filename(inst)} {inst['property']['id']}")
-        c = const_def_string(inst)
-        if c is not None:
+        if c is not None and c != "":
             out.append(f"-const {c}")
         lvl_def = lvl_width_string(inst)
     out += cfg["cmd"]
     if lvl_def is not None and "--reward-aware" in cfg["cmd"] and "--check-fully-observable" not in cfg["cmd"]:
         out[out.index("--reward-aware")] = f"--reward-aware {lvl_def}"
     return " ".join(out)
+
+# Batching: invocations that only differ in their property (including the constants that only occur in the property file) are executed by a single storm call
+def get_property_file_content(inst):
+    with open(executing.replace_placeholders_in_cmd_string(benchmarks.get_full_property_filename(inst)), 'r') as props_file:
+        return props_file.read()
+
+def get_property_constants(inst):
+    """ Returns the names of the constants that are declared in the property file of the instance (e.g. reward bounds). """
+    return re.findall(r"^\s*const\s+\w+\s+(\w+)\s*;", get_property_file_content(inst), re.MULTILINE)
+
+def model_const_def_string(inst):
+    """ Returns the definitions of the constants that occur in the model file (i.e., not only in the property file). """
+    pars = inst["model"].get("open-parameters", OrderedDict())
+    prop_constants = get_property_constants(inst)
+    return ",".join([f"{p}={pars[p]}" for p in pars if not p.startswith("__lvl") and p not in prop_constants])
+
+def get_batch_key(cfg, inst):
+    """ Invocations with the same key can be batched: they use the same model (with the same constants) and configuration. """
+    return (cfg["id"], benchmarks.get_full_model_filename(inst), model_const_def_string(inst), lvl_width_string(inst), benchmarks.get_full_property_filename(inst))
+
+def create_batch_property_file(insts, path):
+    """ Writes a property file with one property per instance (named p0, p1, ...) in which the constants of the property file are replaced by their values. """
+    properties = []
+    for k, inst in enumerate(insts):
+        match = re.search(r'"{}"\s*:\s*([^;]*);'.format(re.escape(inst["property"]["id"])), get_property_file_content(inst))
+        assert match is not None, f"Property {inst['property']['id']} not found for instance {inst['id']}."
+        formula = match.group(1)
+        for c in get_property_constants(inst):
+            formula = re.sub(r"\b{}\b".format(c), str(inst["model"]["open-parameters"][c]), formula)
+        properties.append(f'"p{k}": {formula};')
+    with open(path, 'w') as props_file:
+        props_file.write("\n".join(properties) + "\n")
+
+def get_batch_command_line_args(cfg, insts, batch_property_filename):
+    """ Returns the command line arguments for checking the properties of all given instances (see create_batch_property_file) within a single storm call. """
+    inst = insts[0]
+    out = [f"--prism {benchmarks.get_full_model_filename(inst)}"]
+    out.append(f"--prop {batch_property_filename} {','.join([f'p{k}' for k in range(len(insts))])}")
+    model_constants = model_const_def_string(inst)
+    if model_constants != "":
+        out.append(f"-const {model_constants}")
+    lvl_def = lvl_width_string(inst)
+    out += cfg["cmd"]
+    if lvl_def is not None and "--reward-aware" in cfg["cmd"] and "--check-fully-observable" not in cfg["cmd"]:
+        out[out.index("--reward-aware")] = f"--reward-aware {lvl_def}"
+    return " ".join(out)
+
+# Model cache: each model (with its constants) is built once, exported in storm's explicit format, and loaded from there by the invocations
+def get_cached_model_filename(inst, model_cache_dir):
+    """ Returns the file of the cached model. It is keyed by the content of the model file and the model constants. """
+    with open(executing.replace_placeholders_in_cmd_string(benchmarks.get_full_model_filename(inst)), 'rb') as model_file:
+        key = hashlib.sha256(model_file.read() + b"\n" + model_const_def_string(inst).encode('utf-8')).hexdigest()
+    return os.path.join(model_cache_dir, f"{inst['name']}-{key[:16]}.drn")
+
+def can_use_cached_model(inst):
+    """ The cached model only contains labels and reward models. Hence, it can only be used if the property does not refer to variables, formulas or constants of the model. """
+    match = re.search(r'"{}"\s*:\s*([^;]*);'.format(re.escape(inst["property"]["id"])), get_property_file_content(inst))
+    if match is None: return False
+    formula = re.sub(r'"[^"]*"', "", match.group(1)) # labels and reward models
+    identifiers = set(re.findall(r"[A-Za-z_]\w*", formula))
+    return identifiers.issubset(set(["Pmax", "Pmin", "Rmax", "Rmin", "F", "G", "U", "true", "false"] + get_property_constants(inst)))
+
+def get_model_build_command_line_args(inst, cached_model_filename):
+    """ Returns the command line arguments for building the model of the given instance and exporting it to the given file (including all labels and reward models). """
+    out = [f"--prism {benchmarks.get_full_model_filename(inst)}"]
+    c = model_const_def_string(inst)
+    if c != "":
+        out.append(f"-const {c}")
+    out += ["--buildfull", f"--exportbuild {cached_model_filename}"]
+    return " ".join(out)
+
+def split_batch_log(result_json, log):
+    """
+    Splits the log of a batched execution into logs and results for each invocation of the batch.
+    Each of these logs consists of the common output (e.g. model construction) and the output for the corresponding property.
+    The wallclock time of an invocation is the time for parsing and building the model plus the time for analyzing its property, which is also reported separately as its analysis time.
+    The invocation whose property was being analyzed when the batched execution failed (or all invocations, if it failed before the first property) gets its return code, stderr output and trailer.
+    If the batch was killed before this invocation reached its own time limit, it is not a timeout. Such invocations and the ones whose property was not analyzed at all
+    (e.g. because the tool only analyzed the first property) get no log, i.e., they have to be executed on their own (see store_batch_members in run.py).
+    Returns a list of (result json, log) pairs.
+    """
+    output_pos = log.find("Output:\n") + len("Output:\n")
+    output_end = len(log)
+    for end_marker in [executing.STDERR_HEADING, "\n" + "-"*10 + "\nComputation aborted"]:
+        pos = log.find(end_marker, output_pos)
+        if pos >= 0: output_end = min(output_end, pos)
+    output, remainder = log[output_pos:output_end], log[output_end:]
+    statistics_pos = output.find("\nPerformance statistics:")
+    statistics = output[statistics_pos:] if statistics_pos >= 0 else ""
+    if statistics_pos >= 0: output = output[:statistics_pos]
+    section_starts = [m.start() for m in re.finditer(r"^Analyzing property '.*'$", output, re.MULTILINE)] # does not match the analysis of the belief MDP
+    common_output = output[:section_starts[0]] if len(section_starts) > 0 else output
+    sections = [output[start:end] for start, end in zip(section_starts, section_starts[1:] + [len(output)])]
+    common_time = 0.0 # time spent before the first property
+    for time_key in ["Time for model input parsing: ", "Time for model construction: "]:
+        match = re.search(re.escape(time_key) + r"([\d.]+)s\.", common_output)
+        if match is not None: common_time += float(match.group(1))
+    batch_completed = not result_json["timeout"] and not result_json["execution-error"] and not result_json.get("memout", False)
+    failed_section = None if batch_completed else max(len(sections) - 1, 0) # the section (or the common output) during which the batch failed
+    command = result_json["commands"][0]
+    results = []
+    analysis_times = [re.search(r"Time for POMDP analysis: ([\d.]+)s\.", section) for section in sections]
+    analysis_times = [float(match.group(1)) if match is not None else 0.0 for match in analysis_times]
+    for k, member in enumerate(result_json["batch"]):
+        member_json = OrderedDict([[key, value] for key, value in result_json.items() if key != "batch" and not key.startswith("wallclock-time-")])
+        member_json.update([[key, value] for key, value in member.items() if key not in ["commands", "model-cache"]]) # the member was executed by the command of the batch
+        member_json["batch-of"] = result_json["id"]
+        if k < len(sections) and k != failed_section:
+            member_json["wallclock-time"] = common_time + analysis_times[k]
+            member_json["analysis-time"] = analysis_times[k]
+            member_json["timeout"] = member_json["wallclock-time"] > member_json["time-limit"]
+            member_json["execution-error"] = False
+            if "memout" in member_json: member_json["memout"] = False
+            member_json["return-codes"] = [0]
+            return_code = 0
+            member_log = common_output + sections[k] + statistics + "\n"
+        elif k == failed_section or (failed_section is not None and len(sections) == 0):
+            if result_json["timeout"]:
+                analysis_time = result_json["wallclock-time"] - common_time - sum(analysis_times[:k])
+                if analysis_time < member_json["time-limit"]: # the batch was killed before the time limit of this invocation was reached
+                    results.append((member_json, None))
+                    continue
+                member_json["wallclock-time"] = member_json["time-limit"]
+            killed = result_json["timeout"] or result_json.get("memout", False) # the log of a killed process reports no return code
+            return_code = None if killed or len(result_json["return-codes"]) == 0 else result_json["return-codes"][-1]
+            member_log = common_output + (sections[k] if k < len(sections) else "") + statistics + remainder
+        else:
+            results.append((member_json, None))
+            continue
+        header = "Command:\t{}\nWallclock time:\t{}\nReturn code:\t{}\nOutput:\n".format(command, member_json["wallclock-time"], return_code)
+        results.append((member_json, header + member_log))
+    return results
         
 NAME = "storm"
 DESCRIPTION = ["storm-pomdp"]
@@ -37,189 +176,385 @@ default_executable = "$BENCH_HOME/bin/storm-pomdp"
 
 # Configuration data
 # IDs shall not have a "_" or "."
-CONFIGS = []
-
-base_cfg = OrderedDict()
-base_cfg["tool"] = NAME
-base_cfg["cmd"] = ["--timemem", "--statistics"]
-base_cfg["notes"] = ["Storm-pomdp"]
-base_cfg["supported-obj-types"] = ["rbr"] # the default is to only support reward bounded reachability
-base_cfg["supported-model-types"] = ["pomdp"]
-base_cfg["supported-model-formalisms"] = ["prism"]
-
-for i in range(8,33):
-    seq_c_cfg = copy.deepcopy(base_cfg) # sequential approach with cutoffs (always reward aware)
-    seq_c_cfg["id"] = f'belseqc{i:02}'
-    seq_c_cfg["cmd"] += ["--revised", "--reward-aware", "--belief-exploration unfold", f"--size-threshold {2**i}"]
-    seq_c_cfg["notes"] += [f"Sequential approach, cost aware, with cutoffs and size threshold 2^{i}"]
-    CONFIGS.append(seq_c_cfg)
-    unr_c_cfg = copy.deepcopy(base_cfg) # unfolding approach with cutoffs and reward awareness
-    unr_c_cfg["id"] = f'caunfc{i:02}'
-    unr_c_cfg["cmd"] += ["--revised", "--reward-aware", "--unfold-reward-bound", "--belief-exploration unfold", f"--size-threshold {2**i}"]
-    unr_c_cfg["notes"] += [f"Unfolds cost bounds, cost aware, with cutoffs and size threshold 2^{i}"]
-    CONFIGS.append(unr_c_cfg)
-    uns_c_cfg = copy.deepcopy(base_cfg) # unfolding approach with cutoffs and no reward awareness
-    uns_c_cfg["id"] = f'unfc{i:02}'
-    uns_c_cfg["cmd"] += ["--revised", "--unfold-reward-bound", "--belief-exploration unfold", f"--size-threshold {2**i}"]
-    uns_c_cfg["notes"] += [f"Unfolds cost bounds, not cost-aware, with cutoffs and size threshold 2^{i}"]
-    CONFIGS.append(uns_c_cfg)
-    unb_c_cfg = copy.deepcopy(base_cfg) # discarding reward bounds, with cutoffs and no reward awareness
-    unb_c_cfg["id"] = f'unbc{i:02}'
-    unb_c_cfg["supported-obj-types"] = ["unr"] # only apply this config for unbounded reachability
-    unb_c_cfg["cmd"] += ["--revised", "--belief-exploration unfold", f"--size-threshold {2**i}"]
-    unb_c_cfg["notes"] += [f"Discards the reward bounds, not cost-aware, with cutoffs and size threshold 2^{i}"]
-    # CONFIGS.append(unb_c_cfg)
-
-for i in sorted(set([i*j for i,j in itertools.product([1,2,3,4,5,6,7],[1,2,3,4,5,6,7])])):
-    seq_d_cfg = copy.deepcopy(base_cfg)
-    seq_d_cfg["id"] = f'belseqd{i:02}'
-    seq_d_cfg["cmd"] += ["--revised", "--reward-aware", "--belief-exploration discretize", f"--resolution {i}", "--triangulationmode static"]
-    seq_d_cfg["notes"] += [f"Sequential approach, cost aware, with discretization and resolution {i}"]
-    CONFIGS.append(seq_d_cfg)
-    unr_d_cfg = copy.deepcopy(base_cfg)
-    unr_d_cfg["id"] = f'caunfd{i:02}'
-    unr_d_cfg["cmd"] += ["--revised", "--reward-aware", "--unfold-reward-bound", "--belief-exploration discretize", f"--resolution {i}", "--triangulationmode static"]
-    unr_d_cfg["notes"] += [f"Unfolds cost bounds, cost aware, with discretization and resolution {i}"]
-    CONFIGS.append(unr_d_cfg)
-    uns_d_cfg = copy.deepcopy(base_cfg)
-    uns_d_cfg["id"] = f'unfd{i:02}'
-    uns_d_cfg["cmd"] += ["--revised", "--unfold-reward-bound", "--belief-exploration discretize", f"--resolution {i}", "--triangulationmode static"]
-    uns_d_cfg["notes"] += [f"Unfolds cost bounds, not cost aware, with discretization and resolution {i}"]
-    CONFIGS.append(uns_d_cfg)
-    unb_d_cfg = copy.deepcopy(base_cfg)
-    unb_d_cfg["id"] = f'unbd{i:02}'
-    unb_d_cfg["supported-obj-types"] = ["unr"] # only apply this config for unbounded reachability
-    unb_d_cfg["cmd"] += ["--revised", "--belief-exploration discretize", f"--resolution {i}", "--triangulationmode static"]
-    unb_d_cfg["notes"] += [f"Discards the reward bounds, not cost-aware, with discretization and resolution {i}"]
-    # CONFIGS.append(unb_d_cfg)
-
-# Check fully observable models (not relevant)
-seq_fully_obs = copy.deepcopy(base_cfg)
-seq_fully_obs["id"] = "mdpseq"
-seq_fully_obs["cmd"] += ["--check-fully-observable", "--reward-aware"]
-seq_fully_obs["notes"] += ["Sequential approach on the underlying (fully observable) observable MDP"]
-CONFIGS.append(seq_fully_obs)
-
-# unf_fully_obs = copy.deepcopy(base_cfg)
-# unf_fully_obs["id"] = "funf"
-# unf_fully_obs["cmd"] += ["--check-fully-observable", "--unfold-reward-bound"]
-# unf_fully_obs["notes"] += ["Unfolding approach with fully observable  MDP"]
-# CONFIGS.append(unf_fully_obs)
-
-CONFIGS = sorted(CONFIGS, key=lambda x: x["id"])
+# The configurations are only created when they are first accessed (see __getattr__ below), e.g. not for executing invocations.
+BASE_CFG = (("tool", NAME), ("cmd", ("--timemem", "--statistics")), ("notes", ("Storm-pomdp",)), ("supported-obj-types", ("rbr",)), ("supported-model-types", ("pomdp",)), ("supported-model-formalisms", ("prism",))) # the default is to only support reward bounded reachability
+
+def create_config(identifier, cmd, note, **fields):
+    """ Returns a new configuration that extends the (immutable) base configuration by the given command line arguments and note. Further fields (e.g. supported_obj_types) replace those of the base. """
+    cfg = OrderedDict([[key, list(value) if isinstance(value, tuple) else value] for key, value in BASE_CFG])
+    cfg["cmd"] += cmd
+    cfg["notes"].append(note)
+    for key, value in fields.items(): cfg[key.replace("_", "-")] = value
+    cfg["id"] = identifier
+    return cfg
+
+def create_configs():
+    configs = []
+    for i in range(8,33):
+        # sequential approach with cutoffs (always reward aware)
+        configs.append(create_config(f'belseqc{i:02}', ["--revised", "--reward-aware", "--belief-exploration unfold", f"--size-threshold {2**i}"], f"Sequential approach, cost aware, with cutoffs and size threshold 2^{i}"))
+        # unfolding approach with cutoffs and reward awareness
+        configs.append(create_config(f'caunfc{i:02}', ["--revised", "--reward-aware", "--unfold-reward-bound", "--belief-exploration unfold", f"--size-threshold {2**i}"], f"Unfolds cost bounds, cost aware, with cutoffs and size threshold 2^{i}"))
+        # unfolding approach with cutoffs and no reward awareness
+        configs.append(create_config(f'unfc{i:02}', ["--revised", "--unfold-reward-bound", "--belief-exploration unfold", f"--size-threshold {2**i}"], f"Unfolds cost bounds, not cost-aware, with cutoffs and size threshold 2^{i}"))
+        # discarding reward bounds, with cutoffs and no reward awareness (only for unbounded reachability)
+        # configs.append(create_config(f'unbc{i:02}', ["--revised", "--belief-exploration unfold", f"--size-threshold {2**i}"], f"Discards the reward bounds, not cost-aware, with cutoffs and size threshold 2^{i}", supported_obj_types=["unr"]))
+
+    for i in sorted(set([i*j for i,j in itertools.product([1,2,3,4,5,6,7],[1,2,3,4,5,6,7])])):
+        configs.append(create_config(f'belseqd{i:02}', ["--revised", "--reward-aware", "--belief-exploration discretize", f"--resolution {i}", "--triangulationmode static"], f"Sequential approach, cost aware, with discretization and resolution {i}"))
+        configs.append(create_config(f'caunfd{i:02}', ["--revised", "--reward-aware", "--unfold-reward-bound", "--belief-exploration discretize", f"--resolution {i}", "--triangulationmode static"], f"Unfolds cost bounds, cost aware, with discretization and resolution {i}"))
+        configs.append(create_config(f'unfd{i:02}', ["--revised", "--unfold-reward-bound", "--belief-exploration discretize", f"--resolution {i}", "--triangulationmode static"], f"Unfolds cost bounds, not cost aware, with discretization and resolution {i}"))
+        # configs.append(create_config(f'unbd{i:02}', ["--revised", "--belief-exploration discretize", f"--resolution {i}", "--triangulationmode static"], f"Discards the reward bounds, not cost-aware, with discretization and resolution {i}", supported_obj_types=["unr"]))
+
+    # Check fully observable models (not relevant)
+    configs.append(create_config("mdpseq", ["--check-fully-observable", "--reward-aware"], "Sequential approach on the underlying (fully observable) observable MDP"))
+    # configs.append(create_config("funf", ["--check-fully-observable", "--unfold-reward-bound"], "Unfolding approach with fully observable  MDP"))
+
+    return sorted(configs, key=lambda x: x["id"])
 
 META_CONFIG_TIMELIMITS = [1800]
 BASE_CONFIGS = ["unfc", "unfd", "caunfc", "caunfd", "belseqc", "belseqd"] #, "unbc", "unbd"]
-META_CONFIGS = []
-for timelimit in META_CONFIG_TIMELIMITS:
-    for cfgbase in BASE_CONFIGS:
-        metacfg = OrderedDict()
-        metacfg["id"] = f"{cfgbase}-best-in-{timelimit}s"
-        metacfg["cfgbase"] = cfgbase
-        metacfg["maxtime"] = timelimit
-        META_CONFIGS.append(metacfg)
+
+def create_meta_configs():
+    meta_configs = []
+    for timelimit in META_CONFIG_TIMELIMITS:
+        for cfgbase in BASE_CONFIGS:
+            metacfg = OrderedDict()
+            metacfg["id"] = f"{cfgbase}-best-in-{timelimit}s"
+            metacfg["cfgbase"] = cfgbase
+            metacfg["maxtime"] = timelimit
+            meta_configs.append(metacfg)
+    return meta_configs
+
+# Configuration families: configurations that only differ in their size threshold or resolution, ordered by that parameter.
+CUTOFF_FAMILIES = [b for b in BASE_CONFIGS if b.endswith("c")]
+
+def get_config_family(identifier):
+    """ Returns the family and the parameter of the given configuration, e.g. ('belseqc', 12) for 'belseqc12', or None if the configuration belongs to no family. """
+    match = re.fullmatch(r"([a-z]+)(\d+)", identifier)
+    if match is None or match.group(1) not in BASE_CONFIGS: return None
+    return match.group(1), int(match.group(2))
+
+def get_pruning_reason(result_json, log_path):
+    """
+    Returns a reason why the members of the configuration family that have a larger parameter do not need to be executed on the same instance, or None.
+    This is the case if the execution ran out of time or memory, or if the belief MDP was explored completely despite the cutoffs.
+    """
+    if result_json.get("timeout", False): return "timeout"
+    with open(log_path, 'r', encoding='utf-8', errors='replace') as logfile:
+        log = logfile.read()
+    memout = result_json["memout"] if "memout" in result_json else KILLED_MESSAGE in log # see parse_logfile
+    if memout or "std::bad_alloc" in log: return "memout"
+    family = get_config_family(result_json["configuration-id"])
+    if family is not None and family[0] in CUTOFF_FAMILIES and result_json["return-codes"] == [0] and "\nResult: " in log and "Exploration stopped before all beliefs were explored" not in log:
+        return "belief MDP explored completely"
+    return None
+
+# Registries for looking up configurations by id and family
+LAZY_ATTRIBUTES = ["CONFIGS", "META_CONFIGS", "CONFIGS_BY_ID", "CONFIGS_BY_FAMILY"]
+REGISTRY = dict() # name of lazy attribute -> value
+
+def get_registry():
+    """ Creates the configurations and their registries on first use. """
+    if len(REGISTRY) == 0:
+        configs, meta_configs = create_configs(), create_meta_configs()
+        configs_by_family = OrderedDict([[b, []] for b in BASE_CONFIGS]) # ordered by their parameter
+        for cfg in configs:
+            if get_config_family(cfg["id"]) is not None: configs_by_family[get_config_family(cfg["id"])[0]].append(cfg)
+        for family_cfgs in configs_by_family.values():
+            family_cfgs.sort(key=lambda c: get_config_family(c["id"])[1])
+        REGISTRY.update(CONFIGS=configs, META_CONFIGS=meta_configs, CONFIGS_BY_ID=OrderedDict([[c["id"], c] for c in configs + meta_configs]), CONFIGS_BY_FAMILY=configs_by_family)
+    return REGISTRY
+
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES: return get_registry()[name]
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 def config_from_id(identifier):
-    for c in CONFIGS + META_CONFIGS:
-        if c["id"] == identifier: return c
-    assert False, f"Configuration identifier {identifier} is not known for {NAME}."
+    configs_by_id = get_registry()["CONFIGS_BY_ID"]
+    assert identifier in configs_by_id, f"Configuration identifier {identifier} is not known for {NAME}."
+    return configs_by_id[identifier]
+
+# Memory estimation
+MEMORY_PER_BELIEF_STATE = 2 / 1024 # in MB, roughly the 90th percentile of the ratio for the belseqc20 runs in experiments/logs.tar.gz
+MEMORY_BASE = 1100 # in MB, observed peak memory usage of small belseqc runs
+# 90th percentile of the peak memory (in MB) of the runs of each configuration family in experiments/logs.tar.gz.
+# Caps the estimates without previous runs, as the peak memory does not keep growing with the size threshold (e.g. 8.4GB for belseqc23 to belseqc32).
+FAMILY_PEAK_MEMORY = OrderedDict([["unfc", 7888], ["unfd", 38466], ["caunfc", 10963], ["caunfd", 38708], ["belseqc", 8403], ["belseqd", 1807]])
+
+def get_peak_memory(log_excerpt):
+    """ Returns the peak memory (in MB) reported by --timemem, math.inf if the log indicates a memout, or None if unknown. """
+    match = re.search(r"peak memory usage: (\d+)MB", log_excerpt)
+    if match is not None: return int(match.group(1))
+    if contains_any_of(log_excerpt, ["std::bad_alloc", "Return code:\t-9"]): return math.inf
+    return None
+
+def estimate_peak_memory(invocation, log_dirs = []):
+    """
+    Estimates the peak memory (in MB) of the given invocation.
+    Previous runs of the same invocation in the given log directories (and the invocation's own log directory) take precedence.
+    For these, the measured peak memory is preferred over the one reported by storm.
+    Otherwise, the estimate is derived from the size threshold of the configuration and capped by the archived peak memory of its family (see FAMILY_PEAK_MEMORY).
+    Returns None if no estimate is possible.
+    """
+    estimates = []
+    for log_dir in log_dirs + [invocation["log-dir"]]:
+        log_path = os.path.join(log_dir, invocation["log"])
+        if not os.path.isfile(log_path): continue
+        json_path = os.path.splitext(log_path)[0] + ".json"
+        if os.path.isfile(json_path):
+            with open(json_path, 'r', encoding='utf-8-sig') as json_file:
+                result_json = json.load(json_file)
+            if result_json.get("memout", False):
+                estimates.append(max(result_json["memory-limit"], result_json.get("peak-memory", 0)) * 2) # needs more than the previous limit
+                continue
+            killed = result_json["execution-error"] and -9 in result_json["return-codes"] # e.g. by the OOM killer
+            if "peak-memory" in result_json and not killed: # peak memory of the child process as measured by the benchmarking tool
+                estimates.append(result_json["peak-memory"])
+                continue
+        with open(log_path, 'rb') as logfile:
+            log_excerpt = logfile.read(1024) # return codes are at the beginning of the log...
+            logfile.seek(max(0, os.path.getsize(log_path) - 4096))
+            log_excerpt += logfile.read() # ... and the statistics at its end
+            estimate = get_peak_memory(log_excerpt.decode('utf8', errors='replace'))
+        if estimate is not None: estimates.append(estimate)
+    if len(estimates) > 0: return max(estimates)
+    family = get_config_family(invocation["configuration-id"])
+    cap = FAMILY_PEAK_MEMORY.get(family[0]) if family is not None else None
+    match = re.search(r"--size-threshold (\d+)", " ".join(invocation["commands"]))
+    if match is None: return cap
+    estimate = MEMORY_BASE + int(match.group(1)) * MEMORY_PER_BELIEF_STATE
+    return estimate if cap is None else min(estimate, cap)
     
 # LOGFILE Parsing
-def contains_any_of(log, msg): 
+PARSER_VERSION = 1 # increase whenever the parsed information changes, which invalidates the parse cache of postprocess.py
+# The sections of a log are parsed like a sequence of searches for the markers below, where each search continues after the previous match (see LogScanner).
+UNSUPPORTED_MESSAGES = [] # add messages that indicate that the invocation is not supported
+MEMOUT_MESSAGES = ["An unexpected exception occurred and caused Storm to terminate. The message of this exception is: std::bad_alloc"] # add messages that indicate that the invocation ran out of memory
+RETURN_CODE_HEADING = "Return code:\t"
+KILLED_RETURN_CODE = "-9" # most likely killed by the OOM killer
+KILLED_MESSAGE = RETURN_CODE_HEADING + KILLED_RETURN_CODE
+KNOWN_ERROR_MESSAGES = [] # add messages that indicate a "known" error, i.e., something that indicates that no warning should be printed
+TRIVIAL_PROPERTY = "'Pmax=? [F true]'"
+INCOMPLETE_MESSAGE = "Exploration stopped before all beliefs were explored"
+
+MARKERS = OrderedDict() # kind -> text
+MARKERS["resolution"] = "--resolution "
+MARKERS["model-building-time"] = "Time for model construction: "
+MARKERS["states"] = "States: \t"
+MARKERS["transitions"] = "Transitions: \t"
+MARKERS["choices"] = "Choices: \t"
+MARKERS["observations"] = "Observations: \t"
+MARKERS["property"] = "Analyzing property "
+MARKERS["unfolding"] = "Perform explicit unfolding of reward bounds."
+MARKERS["ca"] = "Extend observation function to become reward aware."
+MARKERS["incomplete"] = INCOMPLETE_MESSAGE
+MARKERS["belief-mdp"] = "Constructing the belief MDP..."
+MARKERS["expl-time"] = "Time for exploring beliefs: "
+MARKERS["build-time"] = "Time for building the belief MDP: "
+MARKERS["chk-time"] = "Time for analyzing the belief MDP: "
+MARKERS["num-epochs"] = "#checked epochs: "
+MARKERS["result"] = "\nResult: "
+MARKERS["total-chk-time"] = "Time for POMDP analysis: "
+MARKERS["return-code"] = RETURN_CODE_HEADING
+for i, m in enumerate(UNSUPPORTED_MESSAGES): MARKERS[f"unsupported{i}"] = m
+for i, m in enumerate(MEMOUT_MESSAGES): MARKERS[f"memout{i}"] = m
+for i, m in enumerate(KNOWN_ERROR_MESSAGES): MARKERS[f"known-error{i}"] = m
+UNSUPPORTED_KINDS = [f"unsupported{i}" for i in range(len(UNSUPPORTED_MESSAGES))]
+MEMOUT_KINDS = [f"memout{i}" for i in range(len(MEMOUT_MESSAGES))]
+KNOWN_ERROR_KINDS = [f"known-error{i}" for i in range(len(KNOWN_ERROR_MESSAGES))]
+MODEL_STATISTICS = ("states", "transitions", "choices", "observations")
+BELIEF_MDP_STATISTICS = ("states", "transitions", "choices")
+BELIEF_MDP_TIMES = ("expl-time", "build-time", "chk-time")
+
+ENCODED_MARKERS = OrderedDict([[kind, text.encode('utf-8')] for kind, text in MARKERS.items()]) # for bytes-like logs
+
+def contains_any_of(log, msg):
     for m in msg:
         if m in log: return True
     return False
 
-def try_parse(log, start, before, after, out_dict, out_key, out_type):
-    pos1 = log.find(before, start)
-    if pos1 >= 0:
-        pos1 += len(before)
-        pos2 = log.find(after, pos1)
-        if pos2 >= 0:
-            out_dict[out_key] = out_type(log[pos1:pos2])
-            return pos2 + len(after)
-    return start
+def decode_utf8(value):
+    return value.decode('utf-8')
+
+class LogScanner(object):
+    """
+    Finds the markers of a log. Each marker is searched on demand with find, which beats sweeping the log once for all markers even for logs of ~100MB.
+    The log is a str or a bytes-like object, e.g. a memory-mapped logfile, which is then not copied into a python string.
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self.is_text = isinstance(log, str)
+        self.needles = MARKERS if self.is_text else ENCODED_MARKERS
+        self.find = log.find
+        if not self.is_text: self.parse = self.parse_encoded
+
+    def contains_any_of(self, kinds):
+        for kind in kinds:
+            if self.find(self.needles[kind], 0) >= 0: return True
+        return False
+
+    def is_at(self, pos, text):
+        """ Returns True if the given text occurs at the given position of the log. """
+        text = text if self.is_text else text.encode('utf-8')
+        return self.log[pos:pos + len(text)] == text
+
+    def parse(self, kind, start, after, out_type, end = None):
+        """ Like a search for the marker from start (that ends before end), followed by a search for the text after the value. Returns the value (or None) and the position to continue from. """
+        needle = self.needles[kind]
+        pos1 = self.find(needle, start) if end is None else self.find(needle, start, end)
+        if pos1 >= 0:
+            pos1 += len(needle)
+            pos2 = self.find(after, pos1)
+            if pos2 >= 0: return out_type(self.log[pos1:pos2]), pos2 + len(after)
+        return None, start
+
+    def parse_encoded(self, kind, start, after, out_type, end = None):
+        """ Replaces parse for bytes-like logs: the text after the value is encoded and str values are decoded (int and float accept bytes). """
+        return LogScanner.parse(self, kind, start, after.encode('utf-8'), decode_utf8 if out_type is str else out_type, end)
+
+    def parse_values(self, values, kinds, start, after = "\n", out_type = int):
+        """ Like parse for each of the given kinds in turn, where found values are stored in the given OrderedDict (e.g. statistics of a model). Returns the position to continue from. """
+        log, find, needles = self.log, self.find, self.needles
+        if not self.is_text: after = after.encode('utf-8')
+        for kind in kinds:
+            pos1 = find(needles[kind], start)
+            if pos1 < 0: continue
+            pos1 += len(needles[kind])
+            pos2 = find(after, pos1)
+            if pos2 < 0: continue
+            values[kind] = out_type(log[pos1:pos2])
+            start = pos2 + len(after)
+        return start
+
+@dataclasses.dataclass
+class LogRecord:
+    """
+    The information in a storm log. Sections that are not found are None.
+    Statistics of models (states, transitions, ...) are OrderedDicts with the keys of the execution result, so they can be added to it as they are.
+    """
+    not_supported: bool = False
+    memout_message: bool = False
+    killed: bool = False
+    expected_error: bool = False
+    resolution: Optional[int] = None
+    model_building_time: Optional[float] = None
+    input_model: Optional[OrderedDict] = None
+    property_found: bool = False
+    trivial_property: bool = False
+    unfolding_pomdp: Optional[OrderedDict] = None
+    ca_pomdp: Optional[OrderedDict] = None
+    belief_mdp_incomplete: bool = False
+    belief_mdp: Optional[OrderedDict] = None
+    num_epochs: Optional[int] = None
+    result: Optional[str] = None
+    total_chk_time: Optional[float] = None
+
+def parse_log_record(log):
+    """ Parses the given log (a str or a bytes-like object, e.g. a memory-mapped logfile) and returns a LogRecord. """
+    scanner = LogScanner(log)
+    find, needles = scanner.find, scanner.needles # searches for markers are inlined, as they are many
+    record = LogRecord()
+    record.not_supported = scanner.contains_any_of(UNSUPPORTED_KINDS)
+    record.memout_message = scanner.contains_any_of(MEMOUT_KINDS)
+    header_end = find(needles["return-code"], 0) # the header of the log lists the command line and then the return code
+    record.killed = header_end >= 0 and scanner.is_at(header_end + len(RETURN_CODE_HEADING), KILLED_RETURN_CODE)
+    record.expected_error = scanner.contains_any_of(KNOWN_ERROR_KINDS)
+
+    record.resolution, pos = scanner.parse("resolution", 0, " --triangulationmode", int, header_end if header_end >= 0 else len(log))
+    record.model_building_time, pos = scanner.parse("model-building-time", pos, "s.", float)
+    if pos == 0: return record
+    record.input_model = OrderedDict()
+    pos = scanner.parse_values(record.input_model, MODEL_STATISTICS, pos)
+
+    pos = find(needles["property"], pos)
+    if pos < 0: return record
+    record.property_found = True
+    record.trivial_property = scanner.is_at(pos + len(MARKERS["property"]), TRIVIAL_PROPERTY) # the log of an invocation analyzes a single property
+
+    posUnf = find(needles["unfolding"], pos)
+    posCa = find(needles["ca"], pos) if posUnf < 0 else -1
+    if posUnf >= 0:
+        record.unfolding_pomdp = OrderedDict()
+        pos = scanner.parse_values(record.unfolding_pomdp, MODEL_STATISTICS, posUnf)
+    elif posCa >= 0:
+        record.ca_pomdp = OrderedDict()
+        pos = scanner.parse_values(record.ca_pomdp, MODEL_STATISTICS, posCa)
+
+    record.belief_mdp_incomplete = find(needles["incomplete"], pos) >= 0 # printed while exploring the beliefs
+
+    posBel = find(needles["belief-mdp"], pos)
+    if posBel >= 0:
+        record.belief_mdp = OrderedDict()
+        pos = scanner.parse_values(record.belief_mdp, BELIEF_MDP_STATISTICS, posBel)
+        pos = scanner.parse_values(record.belief_mdp, BELIEF_MDP_TIMES, pos, "s.", float)
+
+    # intentionally, this is now only parsed if the belief MDP is *not* constructed.
+    # this is because the belief MDP might be incomplete and thus the reported number of checked epochs might be lower
+    record.num_epochs, pos = scanner.parse("num-epochs", pos, ".\n", int)
+
+    record.result, pos = scanner.parse("result", pos, "\n", str)
+    record.total_chk_time, pos = scanner.parse("total-chk-time", pos, "s.", float)
+    return record
+
+def read_log_record(log_path):
+    """ Parses the given logfile via a memory map, so large logs are not read into memory. """
+    with open(log_path, 'rb') as logfile:
+        if os.fstat(logfile.fileno()).st_size == 0: return parse_log_record(b"")
+        with mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ) as log:
+            return parse_log_record(log)
 
 def parse_logfile(log, inv):
-    unsupported_messages = [] # add messages that indicate that the invocation is not supported
-    inv["not-supported"] = contains_any_of(log, unsupported_messages)
-    memout_messages = [] # add messages that indicate that the invocation is not supported
-    memout_messages.append("An unexpected exception occurred and caused Storm to terminate. The message of this exception is: std::bad_alloc")
-    memout_messages.append("Return code:\t-9")
-    inv["memout"] = contains_any_of(log, memout_messages)
-    known_error_messages = [] # add messages that indicate a "known" error, i.e., something that indicates that no warning should be printed
-    inv["expected-error"] = contains_any_of(log, known_error_messages)
+    """ Adds the information of the given log (see parse_log_record) to the given execution result. The statistics of a given LogRecord become part of the execution result. """
+    record = log if isinstance(log, LogRecord) else parse_log_record(log)
+    inv["not-supported"] = record.not_supported
+    if "memout" in inv:
+        # The memory limit was enforced by the benchmarking tool, so a killed process is not necessarily a memout.
+        inv["memout"] = inv["memout"] or record.memout_message
+    else:
+        inv["memout"] = record.memout_message or record.killed
+    inv["expected-error"] = record.expected_error
     if inv["not-supported"] or inv["expected-error"]: return
     if len(inv["return-codes"]) != 1 or inv["return-codes"][0] != 0:
         if not inv["timeout"] and not inv["memout"]: print("WARN: Unexpected return code(s): {} in {}".format(inv["return-codes"], inv["id"]))
 
-    pos = 0
-
-    pos = try_parse(log, pos, "--resolution ", " --triangulationmode", inv, "resolution", int)
-
-    pos = try_parse(log, pos, "Time for model construction: ", "s.", inv, "model-building-time", float)
-    if pos == 0: 
+    if record.resolution is not None: inv["resolution"] = record.resolution
+    if record.model_building_time is not None: inv["model-building-time"] = record.model_building_time
+    if record.input_model is None:
         assert inv["timeout"] or inv["memout"], "WARN: unable to get model construction time for {}".format(inv["id"])
         return
-    inv["input-model"] = OrderedDict()
-    pos = try_parse(log, pos, "States: \t", "\n", inv["input-model"], "states", int)
-    pos = try_parse(log, pos, "Transitions: \t", "\n", inv["input-model"], "transitions", int)
-    pos = try_parse(log, pos, "Choices: \t", "\n", inv["input-model"], "choices", int)
-    pos = try_parse(log, pos, "Observations: \t", "\n", inv["input-model"], "observations", int)
-
-    pos = log.find("Analyzing property ", pos)
-    if pos < 0:
+    inv["input-model"] = record.input_model
+
+    if not record.property_found:
         assert inv["memout"] or inv["timeout"], "Unable to find query output in {}".format(inv["id"])
         return
 
-    if "Analyzing property 'Pmax=? [F true]'" in log: # todo this is to catch the trivial case
+    if record.trivial_property: # todo this is to catch the trivial case
         inv["result"] = "≥1.0"
         inv["total-chk-time"] = "0.0"
 
-    posUnf = log.find("Perform explicit unfolding of reward bounds.", pos)
-    posCa = log.find("Extend observation function to become reward aware.", pos)
-    if posUnf >= 0:
-        pos = posUnf
-        inv["unfolding-pomdp"] = OrderedDict()
-        pos = try_parse(log, pos, "States: \t", "\n", inv["unfolding-pomdp"], "states", int)
-        pos = try_parse(log, pos, "Transitions: \t", "\n", inv["unfolding-pomdp"], "transitions", int)
-        pos = try_parse(log, pos, "Choices: \t", "\n", inv["unfolding-pomdp"], "choices", int)
-        pos = try_parse(log, pos, "Observations: \t", "\n", inv["unfolding-pomdp"], "observations", int)
-    elif posCa >= 0:
-        pos = posCa
-        inv["ca-pomdp"] = OrderedDict()
-        pos = try_parse(log, pos, "States: \t", "\n", inv["ca-pomdp"], "states", int)
-        pos = try_parse(log, pos, "Transitions: \t", "\n", inv["ca-pomdp"], "transitions", int)
-        pos = try_parse(log, pos, "Choices: \t", "\n", inv["ca-pomdp"], "choices", int)
-        pos = try_parse(log, pos, "Observations: \t", "\n", inv["ca-pomdp"], "observations", int)
-
+    if record.unfolding_pomdp is not None:
+        inv["unfolding-pomdp"] = record.unfolding_pomdp
+    elif record.ca_pomdp is not None:
+        inv["ca-pomdp"] = record.ca_pomdp
 
-    if "Exploration stopped before all beliefs were explored" in log:
+    if record.belief_mdp_incomplete:
         inv["belief-mdp-incomplete"] = True
 
-    posBel = log.find("Constructing the belief MDP...", pos)
-    if posBel>=0:
-        pos=posBel
-        inv["belief-mdp"] = OrderedDict()
-        pos = try_parse(log, pos, "States: \t", "\n", inv["belief-mdp"], "states", int)
-        pos = try_parse(log, pos, "Transitions: \t", "\n", inv["belief-mdp"], "transitions", int)
-        pos = try_parse(log, pos, "Choices: \t", "\n", inv["belief-mdp"], "choices", int)
-        pos = try_parse(log, pos, "Time for exploring beliefs: ", "s.", inv["belief-mdp"], "expl-time", float)
-        pos = try_parse(log, pos, "Time for building the belief MDP: ", "s.", inv["belief-mdp"], "build-time", float)
-        pos = try_parse(log, pos, "Time for analyzing the belief MDP: ", "s.", inv["belief-mdp"], "chk-time", float)
-        inv["belief-mdp-states"] = inv["belief-mdp"].get("states", 0)
-
-    # intentionally, this is now only parsed if the belief MDP is *not* constructed.
-    # this is because the belief MDP might be incomplete and thus the reported number of checked epochs might be lower
-    pos = try_parse(log, pos, "#checked epochs: ", ".\n", inv, "num-epochs", int)
+    if record.belief_mdp is not None:
+        inv["belief-mdp"] = record.belief_mdp
+        inv["belief-mdp-states"] = record.belief_mdp.get("states", 0)
 
-    pos = try_parse(log, pos, "\nResult: ", "\n", inv, "result", str)
-    pos = try_parse(log, pos, "Time for POMDP analysis: ", "s.", inv, "total-chk-time", float)
+    if record.num_epochs is not None: inv["num-epochs"] = record.num_epochs
+    if record.result is not None: inv["result"] = record.result
+    if record.total_chk_time is not None: inv["total-chk-time"] = record.total_chk_time
 
     assert inv["memout"] or inv["timeout"] or ("result" in inv and "total-chk-time" in inv), "Unable to find result or total-chk-time in {}".format(inv["id"]);
 
 if __name__ == "__main__":
-    print(f"{len(CONFIGS)} config(s) for {NAME}")
-    print(json.dumps(CONFIGS,indent='\t'))
+    configs = get_registry()["CONFIGS"]
+    print(f"{len(configs)} config(s) for {NAME}")
+    print(json.dumps(configs,indent='\t'))
 
 
@@ -12,7 +12,53 @@ def config_from_id(tool, identifier):
     else:
         return tool.config_from_id(identifier)
 
-def get_command_line_args(cfg, inst = None):
+def get_command_line_args(cfg, inst = None, model_cache_dir = None):
     toolname = cfg["tool"]
     assert toolname in TOOL_NAMES, f"Unknown tool '{toolname}'"
-    return TOOL_NAMES[toolname].get_command_line_args(cfg, inst)
+    return TOOL_NAMES[toolname].get_command_line_args(cfg, inst, model_cache_dir)
+
+def estimate_peak_memory(invocation, log_dirs = []):
+    toolname = invocation["tool"]
+    assert toolname in TOOL_NAMES, f"Unknown tool '{toolname}'"
+    return TOOL_NAMES[toolname].estimate_peak_memory(invocation, log_dirs)
+
+def get_config_family(tool, identifier):
+    assert tool in TOOL_NAMES, f"Unknown tool '{tool}'"
+    return TOOL_NAMES[tool].get_config_family(identifier)
+
+def get_pruning_reason(result_json, log_path):
+    toolname = result_json["tool"]
+    assert toolname in TOOL_NAMES, f"Unknown tool '{toolname}'"
+    return TOOL_NAMES[toolname].get_pruning_reason(result_json, log_path)
+
+def get_batch_key(cfg, inst):
+    toolname = cfg["tool"]
+    assert toolname in TOOL_NAMES, f"Unknown tool '{toolname}'"
+    return TOOL_NAMES[toolname].get_batch_key(cfg, inst)
+
+def create_batch_property_file(cfg, insts, path):
+    toolname = cfg["tool"]
+    assert toolname in TOOL_NAMES, f"Unknown tool '{toolname}'"
+    return TOOL_NAMES[toolname].create_batch_property_file(insts, path)
+
+def get_batch_command_line_args(cfg, insts, batch_property_filename):
+    toolname = cfg["tool"]
+    assert toolname in TOOL_NAMES, f"Unknown tool '{toolname}'"
+    return TOOL_NAMES[toolname].get_batch_command_line_args(cfg, insts, batch_property_filename)
+
+def split_batch_log(result_json, log):
+    toolname = result_json["tool"]
+    assert toolname in TOOL_NAMES, f"Unknown tool '{toolname}'"
+    return TOOL_NAMES[toolname].split_batch_log(result_json, log)
+
+def get_cached_model_filename(cfg, inst, model_cache_dir):
+    """ Returns the file in the model cache from which the model of the given instance is loaded, or None if the cached model can not be used. """
+    toolname = cfg["tool"]
+    assert toolname in TOOL_NAMES, f"Unknown tool '{toolname}'"
+    if not TOOL_NAMES[toolname].can_use_cached_model(inst): return None
+    return TOOL_NAMES[toolname].get_cached_model_filename(inst, model_cache_dir)
+
+def get_model_build_command_line_args(cfg, inst, cached_model_filename):
+    toolname = cfg["tool"]
+    assert toolname in TOOL_NAMES, f"Unknown tool '{toolname}'"
+    return TOOL_NAMES[toolname].get_model_build_command_line_args(inst, cached_model_filename)
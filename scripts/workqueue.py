@@ -0,0 +1,133 @@
+import os, json, threading, time, socket
+from collections import OrderedDict
+
+DEFAULT_LEASE_TIME = 600 # in seconds
+
+def parse_shard(shard_str):
+    """ Parses a shard specification 'k/n' (with 0 <= k < n) and returns the pair (k, n). """
+    parts = shard_str.split("/")
+    assert len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit(), f"Invalid shard '{shard_str}'. Expected k/n."
+    k, n = int(parts[0]), int(parts[1])
+    assert 0 <= k < n, f"Invalid shard '{shard_str}'. Expected 0 <= k < n."
+    return k, n
+
+def get_shard(invocation_indices, shard):
+    """ Returns the indices of the given shard (k, n), i.e., every n-th invocation starting at the k-th one. """
+    k, n = shard
+    return [i for i in invocation_indices if i % n == k]
+
+
+class WorkQueue(object):
+    """
+    Work queue in a (shared) directory that lets several independent workers drain the same invocations file.
+    A worker claims an invocation by atomically creating the claim file '<index>.claim' and marks it as finished with the file '<index>.done'.
+    While an invocation runs, its claim is renewed periodically. Claims that were not renewed within the lease time (e.g. because the worker crashed) are re-leased to other workers.
+    """
+    def __init__(self, queue_dir, lease_time = DEFAULT_LEASE_TIME):
+        self.queue_dir = queue_dir
+        self.lease_time = lease_time
+        self.worker = f"{socket.gethostname()}.{os.getpid()}"
+        self.claimed = set()
+        self.lock = threading.Lock()
+        os.makedirs(queue_dir, exist_ok=True)
+        heartbeat = threading.Thread(target=self.renew_claims, name="work-queue-heartbeat", daemon=True)
+        heartbeat.start()
+
+    def get_claim_path(self, i):
+        return os.path.join(self.queue_dir, f"{i}.claim")
+
+    def get_done_path(self, i):
+        return os.path.join(self.queue_dir, f"{i}.done")
+
+    def is_finished(self, i):
+        return os.path.isfile(self.get_done_path(i))
+
+    def is_stale(self, path):
+        return time.time() - os.path.getmtime(path) > self.lease_time
+
+    def create_claim(self, i):
+        """ Atomically creates the claim file of the given invocation. Raises FileExistsError if it is already claimed. """
+        fd = os.open(self.get_claim_path(i), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        with os.fdopen(fd, 'w') as claim_file:
+            json.dump(OrderedDict(worker=self.worker, time=time.time()), claim_file)
+        with self.lock:
+            self.claimed.add(i)
+
+    def owns_claim(self, i):
+        """ Returns True if the claim file of the given invocation was created by this worker (and not re-leased by another one). """
+        try:
+            with open(self.get_claim_path(i), 'r') as claim_file:
+                return json.load(claim_file)["worker"] == self.worker
+        except (FileNotFoundError, ValueError, KeyError):
+            return False # released, or another worker is just writing its claim
+
+    def claim(self, i):
+        """ Tries to claim the given invocation. Returns True if this worker shall execute it, which includes invocations it claimed already. """
+        if self.is_finished(i): return False
+        with self.lock:
+            if i in self.claimed: return True # e.g. claimed but not started by the scheduler, as it did not fit into the memory budget
+        try:
+            self.create_claim(i)
+            if self.is_finished(i): # finished by another worker right before we claimed it
+                self.release(i)
+                return False
+            return True
+        except FileExistsError:
+            pass
+        # Re-lease the claim if it is stale. Renaming is atomic, so only one worker can take over the claim.
+        claim_path = self.get_claim_path(i)
+        stale_path = f"{claim_path}.{self.worker}"
+        try:
+            if not self.is_stale(claim_path): return False
+            os.rename(claim_path, stale_path)
+        except FileNotFoundError:
+            return False # the claim was released or taken over in the meantime
+        if not self.is_stale(stale_path): # another worker re-leased the claim right before us, so we give it back
+            try:
+                os.link(stale_path, claim_path)
+            except FileExistsError:
+                pass
+            os.remove(stale_path)
+            return False
+        os.remove(stale_path)
+        print(f"WARN: Re-leasing stale claim of invocation #{i}.")
+        try:
+            self.create_claim(i)
+            return True
+        except FileExistsError:
+            return False
+
+    def release(self, i):
+        """
+        Releases the claim of the given invocation without marking it as finished, e.g. after it was aborted.
+        The claim file is kept if another worker re-leased the invocation in the meantime.
+        """
+        with self.lock:
+            self.claimed.discard(i)
+        if self.owns_claim(i):
+            try:
+                os.remove(self.get_claim_path(i))
+            except FileNotFoundError:
+                pass
+
+    def finish(self, i):
+        """ Marks the given invocation as finished and releases its claim. """
+        with open(self.get_done_path(i), 'w') as done_file:
+            json.dump(OrderedDict(worker=self.worker, time=time.time()), done_file)
+        self.release(i)
+
+    def get_unfinished(self, invocation_indices):
+        return [i for i in invocation_indices if not self.is_finished(i)]
+
+    def renew_claims(self):
+        """ Periodically renews the claims of this worker, so they are not considered stale. Runs in a background thread. """
+        while True:
+            time.sleep(self.lease_time / 4)
+            with self.lock:
+                claimed = list(self.claimed)
+            for i in claimed:
+                if not self.owns_claim(i): continue # released or re-leased by another worker in the meantime
+                try:
+                    os.utime(self.get_claim_path(i))
+                except FileNotFoundError:
+                    pass